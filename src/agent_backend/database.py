@@ -3,44 +3,204 @@
 import json
 import sqlite3
 import os
+import queue
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 from contextlib import contextmanager
 
+try:
+    import orjson
+except ImportError:  # optional speedup; falls back to the stdlib
+    orjson = None
+
+
+def json_dumps(value: Any) -> str:
+    """Serialize to a JSON string, using orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits; let the stdlib handle it
+    return json.dumps(value)
+
+
+json_loads = orjson.loads if orjson is not None else json.loads
+
+# Default location: .sessions/sessions.db in the project root
+_DEFAULT_SESSIONS_DIR = Path(__file__).resolve().parents[2] / ".sessions"
+
+# Frequently used statements are kept as constants so the exact same SQL text
+# hits the connections' statement caches on every call.
+_INSERT_MESSAGE_SQL = """
+    INSERT INTO messages (session_id, role, content, timestamp, tool_use, thinking)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+_UPDATE_ACTIVITY_SQL = "UPDATE sessions SET last_activity = ? WHERE session_id = ?"
+_UPDATE_STATUS_SQL = "UPDATE sessions SET status = ? WHERE session_id = ?"
+_UPDATE_STATUS_ACTIVITY_SQL = "UPDATE sessions SET status = ?, last_activity = ? WHERE session_id = ?"
+_UPDATE_STATE_SQL = "UPDATE sessions SET status = ?, last_activity = ?, sdk_session_id = ? WHERE session_id = ?"
+_UPDATE_SDK_SESSION_ID_SQL = "UPDATE sessions SET sdk_session_id = ? WHERE session_id = ?"
+_SELECT_MESSAGES_SQL = "SELECT role, content, timestamp, tool_use, thinking FROM messages WHERE session_id = ? ORDER BY id"
+_SESSION_EXISTS_SQL = "SELECT 1 FROM sessions WHERE session_id = ?"
+# Session rows come with their message count so the history can load lazily
+_SELECT_SESSIONS_SQL = """
+    SELECT s.*,
+           (SELECT COUNT(*) FROM messages m WHERE m.session_id = s.session_id) AS message_count
+    FROM sessions s
+"""
+_UPSERT_SESSION_SQL = """
+    INSERT INTO sessions
+    (session_id, working_directory, system_prompt, allowed_tools,
+     model, status, created_at, last_activity, sdk_session_id, display_name)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(session_id) DO UPDATE SET
+        working_directory = excluded.working_directory,
+        system_prompt = excluded.system_prompt,
+        allowed_tools = excluded.allowed_tools,
+        model = excluded.model,
+        status = excluded.status,
+        created_at = excluded.created_at,
+        last_activity = excluded.last_activity,
+        sdk_session_id = excluded.sdk_session_id,
+        display_name = excluded.display_name
+"""
+
 
 class SessionDatabase:
     """SQLite-based session persistence.
     
     Uses a single SQLite file in the .sessions directory.
     No external dependencies - uses Python's built-in sqlite3.
+    
+    The database runs in WAL mode with one writer connection and a small
+    pool of read-only connections, so reads never wait behind writes.
+    
+    synchronous=NORMAL means a commit is not fsynced until the next WAL
+    checkpoint: the database cannot be corrupted, but the last few
+    transactions may be lost on power failure or OS crash.
     """
     
+    READ_POOL_SIZE = 4
+    
     def __init__(self, db_path: str | None = None):
         if db_path:
             self.db_path = db_path
         else:
-            # Default to .sessions/sessions.db in project root
-            project_root = Path(__file__).parent.parent.parent
-            sessions_dir = project_root / ".sessions"
-            sessions_dir.mkdir(parents=True, exist_ok=True)
-            self.db_path = str(sessions_dir / "sessions.db")
+            _DEFAULT_SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+            self.db_path = str(_DEFAULT_SESSIONS_DIR / "sessions.db")
+        
+        # One long-lived connection in autocommit mode; transactions are
+        # opened explicitly in _get_conn. Calls come from worker threads, so
+        # access is serialized with a lock.
+        self._conn = sqlite3.connect(
+            self.db_path,
+            isolation_level=None,
+            cached_statements=256,
+            check_same_thread=False,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._conn.execute("PRAGMA cache_size=-65536")
+        self._conn.execute("PRAGMA wal_autocheckpoint=1000")
+        self._conn_lock = threading.RLock()
+        self._tx_depth = 0
+        
+        # Read-only connections, opened on demand up to READ_POOL_SIZE
+        self._readers: queue.Queue[sqlite3.Connection] = queue.Queue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
         
         self._init_db()
     
     @contextmanager
     def _get_conn(self):
-        """Get a database connection with proper settings."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Yield the shared connection inside a transaction.
+        
+        Nested calls join the enclosing transaction.
+        """
+        with self._conn_lock:
+            conn = self._conn
+            if self._tx_depth:
+                self._tx_depth += 1
+                try:
+                    yield conn
+                finally:
+                    self._tx_depth -= 1
+                return
+            
+            # IMMEDIATE takes the write lock up front instead of upgrading mid-transaction
+            conn.execute("BEGIN IMMEDIATE")
+            self._tx_depth = 1
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._tx_depth = 0
+    
+    @contextmanager
+    def _get_read_conn(self):
+        """Borrow a read-only connection from the pool."""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._reader_lock:
+                can_open = self._reader_count < self.READ_POOL_SIZE
+                if can_open:
+                    self._reader_count += 1
+            if can_open:
+                conn = sqlite3.connect(
+                    f"{Path(self.db_path).resolve().as_uri()}?mode=ro",
+                    uri=True,
+                    isolation_level=None,
+                    cached_statements=256,
+                    check_same_thread=False,
+                )
+                conn.row_factory = sqlite3.Row
+            else:
+                conn = self._readers.get()
         try:
             yield conn
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            raise
         finally:
-            conn.close()
+            self._readers.put(conn)
+    
+    def execute_batch(self, calls: list[tuple[Callable[..., Any], tuple]]) -> list[Exception | None]:
+        """Run several write methods in one transaction.
+        
+        Each call runs inside its own savepoint, so a failing call is rolled
+        back without affecting the others. Returns the error of each call
+        (None on success).
+        """
+        errors: list[Exception | None] = []
+        with self._get_conn() as conn:
+            for fn, args in calls:
+                conn.execute("SAVEPOINT batch_call")
+                try:
+                    fn(*args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO batch_call")
+                    errors.append(e)
+                else:
+                    errors.append(None)
+                conn.execute("RELEASE batch_call")
+        return errors
+    
+    def close(self) -> None:
+        """Close the writer and all pooled reader connections."""
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._conn_lock:
+            self._conn.close()
     
     def _init_db(self):
         """Initialize database tables."""
@@ -85,67 +245,75 @@ class SessionDatabase:
                 conn.execute("ALTER TABLE sessions ADD COLUMN display_name TEXT")
     
     def save_session(self, session_data: dict[str, Any]) -> None:
-        """Save or update a session."""
+        """Save or update a session row.
+        
+        Messages are stored separately via add_message/add_messages_bulk.
+        """
+        self.save_sessions_bulk([session_data])
+    
+    def save_sessions_bulk(self, sessions_data: list[dict[str, Any]]) -> None:
+        """Save or update several session rows in a single transaction."""
+        if not sessions_data:
+            return
         with self._get_conn() as conn:
-            # Upsert session
-            conn.execute("""
-                INSERT OR REPLACE INTO sessions 
-                (session_id, working_directory, system_prompt, allowed_tools, 
-                 model, status, created_at, last_activity, sdk_session_id, display_name)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                session_data["session_id"],
-                session_data["working_directory"],
-                session_data.get("system_prompt"),
-                json.dumps(session_data.get("allowed_tools")) if session_data.get("allowed_tools") else None,
-                session_data["model"],
-                session_data["status"],
-                session_data["created_at"],
-                session_data["last_activity"],
-                session_data.get("sdk_session_id"),
-                session_data.get("display_name"),
-            ))
-            
-            # Delete existing messages and re-insert
-            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_data["session_id"],))
-            
-            for msg in session_data.get("messages", []):
-                conn.execute("""
-                    INSERT INTO messages (session_id, role, content, timestamp, tool_use, thinking)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
+            # Upsert (not REPLACE) so the row is never deleted and re-created
+            conn.executemany(_UPSERT_SESSION_SQL, [
+                (
                     session_data["session_id"],
-                    msg["role"],
-                    msg["content"],
-                    msg["timestamp"],
-                    json.dumps(msg.get("tool_use")) if msg.get("tool_use") else None,
-                    msg.get("thinking"),
-                ))
+                    session_data["working_directory"],
+                    session_data.get("system_prompt"),
+                    json_dumps(session_data.get("allowed_tools")) if session_data.get("allowed_tools") else None,
+                    session_data["model"],
+                    session_data["status"],
+                    session_data["created_at"],
+                    session_data["last_activity"],
+                    session_data.get("sdk_session_id"),
+                    session_data.get("display_name"),
+                )
+                for session_data in sessions_data
+            ])
+    
+    def _session_from_row(self, row: sqlite3.Row) -> dict[str, Any]:
+        session_data = dict(row)
+        # Parse allowed_tools
+        if session_data.get("allowed_tools"):
+            session_data["allowed_tools"] = json_loads(session_data["allowed_tools"])
+        return session_data
     
     def load_session(self, session_id: str) -> dict[str, Any] | None:
-        """Load a session by ID."""
-        with self._get_conn() as conn:
+        """Load a session row by ID (without messages, but with message_count)."""
+        with self._get_read_conn() as conn:
             row = conn.execute(
-                "SELECT * FROM sessions WHERE session_id = ?", 
+                _SELECT_SESSIONS_SQL + " WHERE s.session_id = ?",
                 (session_id,)
             ).fetchone()
             
             if not row:
                 return None
             
-            session_data = dict(row)
-            
-            # Parse allowed_tools
-            if session_data.get("allowed_tools"):
-                session_data["allowed_tools"] = json.loads(session_data["allowed_tools"])
+            return self._session_from_row(row)
+    
+    def load_all_sessions(self, include_closed: bool = False) -> list[dict[str, Any]]:
+        """Load all session rows (without messages, but with message_count)."""
+        with self._get_read_conn() as conn:
+            if include_closed:
+                rows = conn.execute(_SELECT_SESSIONS_SQL).fetchall()
+            else:
+                rows = conn.execute(
+                    _SELECT_SESSIONS_SQL + " WHERE s.status != 'closed'"
+                ).fetchall()
             
-            # Load messages
+            return [self._session_from_row(row) for row in rows]
+    
+    def load_messages(self, session_id: str) -> list[dict[str, Any]]:
+        """Load the messages of a session in insertion order."""
+        with self._get_read_conn() as conn:
             messages = conn.execute(
-                "SELECT role, content, timestamp, tool_use, thinking FROM messages WHERE session_id = ? ORDER BY id",
+                _SELECT_MESSAGES_SQL,
                 (session_id,)
             ).fetchall()
             
-            session_data["messages"] = []
+            result = []
             for msg in messages:
                 msg_data = {
                     "role": msg["role"],
@@ -153,56 +321,75 @@ class SessionDatabase:
                     "timestamp": msg["timestamp"],
                 }
                 if msg["tool_use"]:
-                    msg_data["tool_use"] = json.loads(msg["tool_use"])
+                    msg_data["tool_use"] = json_loads(msg["tool_use"])
                 if msg["thinking"]:
                     msg_data["thinking"] = msg["thinking"]
-                session_data["messages"].append(msg_data)
+                result.append(msg_data)
             
-            return session_data
-    
-    def load_all_sessions(self, include_closed: bool = False) -> list[dict[str, Any]]:
-        """Load all sessions."""
-        with self._get_conn() as conn:
-            if include_closed:
-                rows = conn.execute("SELECT session_id FROM sessions").fetchall()
-            else:
-                rows = conn.execute(
-                    "SELECT session_id FROM sessions WHERE status != 'closed'"
-                ).fetchall()
-            
-            sessions = []
-            for row in rows:
-                session = self.load_session(row["session_id"])
-                if session:
-                    sessions.append(session)
-            
-            return sessions
+            return result
     
     def delete_session(self, session_id: str) -> bool:
         """Delete a session and its messages."""
         with self._get_conn() as conn:
-            # Messages are deleted automatically via CASCADE
+            # Foreign keys are not enforced, so remove messages explicitly
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
             result = conn.execute(
                 "DELETE FROM sessions WHERE session_id = ?", 
                 (session_id,)
             )
             return result.rowcount > 0
     
+    def delete_messages(self, session_id: str) -> None:
+        """Delete all messages of a session."""
+        with self._get_conn() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+    
     def update_session_activity(self, session_id: str) -> None:
         """Update the last_activity timestamp."""
         with self._get_conn() as conn:
-            conn.execute(
-                "UPDATE sessions SET last_activity = ? WHERE session_id = ?",
-                (datetime.now().isoformat(), session_id)
-            )
+            conn.execute(_UPDATE_ACTIVITY_SQL, (datetime.now().isoformat(), session_id))
+    
+    def update_status(self, session_id: str, status: str, last_activity: str | None = None) -> None:
+        """Update the status (and optionally last_activity) of a session."""
+        with self._get_conn() as conn:
+            if last_activity is None:
+                conn.execute(_UPDATE_STATUS_SQL, (status, session_id))
+            else:
+                conn.execute(_UPDATE_STATUS_ACTIVITY_SQL, (status, last_activity, session_id))
+    
+    def update_session_state(self, session_id: str, status: str, last_activity: str,
+                             sdk_session_id: str | None) -> None:
+        """Update the columns that change during a conversation."""
+        with self._get_conn() as conn:
+            conn.execute(_UPDATE_STATE_SQL, (status, last_activity, sdk_session_id, session_id))
+    
+    def bulk_update_status(self, updates: list[tuple[str, str]]) -> None:
+        """Update the status of several sessions in a single transaction.
+        
+        Each update is a ``(status, session_id)`` tuple.
+        """
+        if not updates:
+            return
+        with self._get_conn() as conn:
+            conn.executemany(_UPDATE_STATUS_SQL, updates)
+    
+    def update_status_many(self, session_ids: list[str], status: str) -> None:
+        """Set the same status on many sessions in a single transaction."""
+        if not session_ids:
+            return
+        with self._get_conn() as conn:
+            # Chunked to stay below SQLite's bound-parameter limit
+            for i in range(0, len(session_ids), 500):
+                chunk = session_ids[i:i + 500]
+                conn.execute(
+                    f"UPDATE sessions SET status = ? WHERE session_id IN ({','.join('?' * len(chunk))})",
+                    (status, *chunk)
+                )
     
     def update_sdk_session_id(self, session_id: str, sdk_session_id: str) -> None:
         """Update the SDK session ID for multi-turn conversations."""
         with self._get_conn() as conn:
-            conn.execute(
-                "UPDATE sessions SET sdk_session_id = ? WHERE session_id = ?",
-                (sdk_session_id, session_id)
-            )
+            conn.execute(_UPDATE_SDK_SESSION_ID_SQL, (sdk_session_id, session_id))
 
     def update_display_name(self, session_id: str, display_name: str | None) -> None:
         """Update the display name for a session."""
@@ -216,30 +403,43 @@ class SessionDatabase:
                     timestamp: str, tool_use: list | None = None, 
                     thinking: str | None = None) -> None:
         """Add a single message to a session."""
-        with self._get_conn() as conn:
-            conn.execute("""
-                INSERT INTO messages (session_id, role, content, timestamp, tool_use, thinking)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
+        self.add_messages_bulk(session_id, [(role, content, timestamp, tool_use, thinking)])
+    
+    def add_messages_bulk(self, session_id: str, messages: list[tuple]) -> None:
+        """Add several messages to a session in a single transaction.
+        
+        Each message is a ``(role, content, timestamp, tool_use, thinking)`` tuple;
+        the timestamp may be an ISO string or a datetime.
+        """
+        if not messages:
+            return
+        rows = [
+            (
                 session_id,
                 role,
                 content,
-                timestamp,
-                json.dumps(tool_use) if tool_use else None,
+                timestamp if isinstance(timestamp, str) else timestamp.isoformat(),
+                json_dumps(tool_use) if tool_use else None,
                 thinking,
-            ))
-            
-            # Update session activity
-            conn.execute(
-                "UPDATE sessions SET last_activity = ? WHERE session_id = ?",
-                (timestamp, session_id)
             )
+            for role, content, timestamp, tool_use, thinking in messages
+        ]
+        with self._get_conn() as conn:
+            conn.executemany(_INSERT_MESSAGE_SQL, rows)
+            
+            # Update session activity to the newest message
+            conn.execute(_UPDATE_ACTIVITY_SQL, (rows[-1][3], session_id))
+    
+    def get_session_ids(self) -> set[str]:
+        """Return the IDs of all stored sessions."""
+        with self._get_read_conn() as conn:
+            return {row[0] for row in conn.execute("SELECT session_id FROM sessions")}
     
     def session_exists(self, session_id: str) -> bool:
         """Check if a session exists."""
-        with self._get_conn() as conn:
+        with self._get_read_conn() as conn:
             row = conn.execute(
-                "SELECT 1 FROM sessions WHERE session_id = ?", 
+                _SESSION_EXISTS_SQL,
                 (session_id,)
             ).fetchone()
             return row is not None
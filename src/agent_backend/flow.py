@@ -133,7 +133,7 @@ class FlowManager:
                     cwd=user_dir,
                     stdout=subprocess.DEVNULL,
                     stderr=subprocess.DEVNULL,
-                    preexec_fn=os.setsid,
+                    start_new_session=True,
                 )
             except Exception as e:
                 self._logger.error("Failed to start Node-RED: %s", e)
@@ -1,12 +1,15 @@
 """FastAPI application for the Claude Agent backend."""
 
 import asyncio
+import atexit
 import logging
+import logging.handlers
 import json
 import time
 import os
 import shutil
 import hashlib
+import queue
 from datetime import datetime
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -14,7 +17,7 @@ from typing import AsyncGenerator
 
 import httpx
 import websockets
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, FileResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
@@ -34,12 +37,32 @@ from .view import get_view_manager, ViewManager
 from .flow import get_flow_manager
 from .preview import get_preview_manager
 
+# Writes log records to stderr on a background thread
+_log_listener: logging.handlers.QueueListener | None = None
+
+
 def _configure_logging() -> None:
+    global _log_listener
     log_level = os.environ.get("APPBUILDER_LOG_LEVEL", "INFO").upper()
-    logging.basicConfig(
-        level=log_level,
-        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    if _log_listener is not None:
+        logging.getLogger().setLevel(log_level)
+        return
+    
+    # Handlers only enqueue records; formatting and the actual write happen on
+    # the listener thread so logging never blocks the event loop.
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
     )
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(-1)
+    _log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    # Attached directly rather than via basicConfig, which would give the
+    # QueueHandler BASIC_FORMAT and prefix every line twice.
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(log_level)
 
 
 # Port configuration
@@ -70,6 +93,8 @@ async def lifespan(app: FastAPI):
     global session_manager, proxy_client
     _configure_logging()
     session_manager = SessionManager()
+    # Build outputs are cached next to the sessions; "_" entries are not sessions
+    get_view_manager().build_cache_dir = Path(session_manager.base_workspace_dir) / "_build_cache"
     proxy_client = httpx.AsyncClient(timeout=60.0, limits=httpx.Limits(max_connections=100))
     
     # Print startup information
@@ -115,6 +140,10 @@ async def lifespan(app: FastAPI):
     except asyncio.CancelledError:
         pass
 
+    # Persist buffered chat messages and queued database writes
+    if session_manager:
+        await session_manager.shutdown()
+
 
 async def periodic_cleanup():
     """Periodically clean up inactive sessions."""
@@ -141,7 +170,7 @@ async def _auto_start_preview_and_flow(session_id: str):
         session_dir = session.working_directory
         
         view_mgr = get_view_manager()
-        project_dir, _ = view_mgr._find_project_dir(session_dir)
+        project_dir, _ = await view_mgr.find_project_dir(session_dir)
         if not project_dir:
             return  # Not a web project, skip
         
@@ -472,10 +501,10 @@ async def list_sessions(include_closed: bool = False) -> SessionListResponse:
     Optionally include closed sessions with the `include_closed` parameter.
     """
     manager = get_session_manager()
-    sessions = await manager.list_sessions(include_closed=include_closed)
+    sessions = list(manager.iter_session_infos(include_closed=include_closed))
     
     return SessionListResponse(
-        sessions=[s.get_info() for s in sessions],
+        sessions=sessions,
         total=len(sessions)
     )
 
@@ -571,6 +600,8 @@ async def close_session(session_id: str, delete: bool = False, keep_directory: b
     
     if delete:
         success = await manager.delete_session(session_id, delete_directory=not keep_directory)
+        if success:
+            await get_view_manager().remove_cached_builds(session_id)
         action = "deleted (including working directory)" if not keep_directory else "deleted (directory preserved)"
     else:
         success = await manager.close_session(session_id)
@@ -812,7 +843,7 @@ async def clear_session_history(session_id: str) -> dict:
     if not session:
         raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
     
-    session.messages.clear()
+    await manager.clear_messages(session_id)
     session.update_activity()
     
     return {"message": f"History cleared for session {session_id}", "session_id": session_id}
@@ -866,12 +897,8 @@ async def stop_view(session_id: str) -> dict:
     }
 
 
-@app.get("/sessions/{session_id}/view/status", tags=["View"])
-async def get_view_status(session_id: str, request: Request) -> dict:
-    """Get the status of the view server for a session."""
-    view_mgr = get_view_manager()
-    status = await view_mgr.get_status(session_id)
-    
+def _view_status_response(session_id: str, status: dict | None) -> dict:
+    """Shape a view manager status for API clients."""
     if status is None:
         return {
             'session_id': session_id,
@@ -891,6 +918,25 @@ async def get_view_status(session_id: str, request: Request) -> dict:
     return status
 
 
+@app.get("/sessions/view/status", tags=["View"])
+async def get_view_statuses(session_ids: list[str] = Query(default=[])) -> dict:
+    """Get view server statuses for several sessions in one request."""
+    view_mgr = get_view_manager()
+    statuses = await view_mgr.get_statuses(session_ids)
+    return {
+        session_id: _view_status_response(session_id, status)
+        for session_id, status in statuses.items()
+    }
+
+
+@app.get("/sessions/{session_id}/view/status", tags=["View"])
+async def get_view_status(session_id: str, request: Request) -> dict:
+    """Get the status of the view server for a session."""
+    view_mgr = get_view_manager()
+    status = await view_mgr.get_status(session_id)
+    return _view_status_response(session_id, status)
+
+
 @app.get("/sessions/{session_id}/view/package", tags=["View"])
 async def download_view_package(session_id: str) -> FileResponse:
     """Download the build package (frontend dist + UNS + flow)."""
@@ -302,7 +302,7 @@ class PreviewManager:
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 env=env,
-                preexec_fn=os.setsid
+                start_new_session=True
             )
             
             server.process = process
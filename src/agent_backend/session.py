@@ -1,23 +1,110 @@
 """Session management for the Claude Agent backend."""
 
 import asyncio
-import json
+import atexit
+import errno
+import heapq
+import logging
 import os
-import secrets
 import shutil
+import sys
+import threading
+import uuid
 from datetime import datetime
+from functools import cached_property
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator
 
 
 def generate_session_id() -> str:
     """Generate a 16-character hex session ID (8 bytes = 64 bits)."""
-    return secrets.token_hex(8)
+    return os.urandom(8).hex()
 
 from .models import ChatMessage, SessionInfo, SessionStatus
-from .database import SessionDatabase
+from .database import SessionDatabase, json_loads
 from .flow import get_flow_manager
 
+logger = logging.getLogger("appbuilder.session")
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# FICLONE ioctl from linux/fs.h (copy-on-write clone on btrfs/XFS)
+_FICLONE = 0x40049409
+_reflink_supported = fcntl is not None and sys.platform.startswith("linux")
+
+# Resolved once; none of these change during the process lifetime
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+_SOURCE_CLAUDE_MD = _PROJECT_ROOT / "claude.md"
+_HOME_CLAUDE = Path(os.path.expanduser("~/.claude"))
+_HOME_AGENTS = Path(os.path.expanduser("~/.agents"))
+# Trees copied into every session by SessionManager._copy_global_skills
+_SKILL_SOURCES = (_HOME_CLAUDE / "skills", _HOME_CLAUDE / "plugins", _HOME_AGENTS / "skills")
+
+
+def _clone_file(source: str, dest: str) -> None:
+    """Place a copy of source at dest as cheaply as the filesystem allows.
+    
+    Tries a copy-on-write reflink first and falls back to a regular copy.
+    Never hard-links: the destination is agent-writable and must not share
+    an inode with the source.
+    """
+    global _reflink_supported
+    if _reflink_supported:
+        try:
+            with open(source, "rb") as src, open(dest, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            shutil.copystat(source, dest)
+            return
+        except OSError as e:
+            if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL):
+                # Filesystem cannot reflink; don't try again
+                _reflink_supported = False
+            try:
+                os.unlink(dest)
+            except OSError:
+                pass
+    shutil.copy2(source, dest)
+
+
+def _clone_tree(source: str, dest: str) -> None:
+    """Mirror the source tree into dest using _clone_file for every file."""
+    os.makedirs(dest, exist_ok=True)
+    with os.scandir(source) as it:
+        for entry in it:
+            target = os.path.join(dest, entry.name)
+            try:
+                if entry.is_dir():
+                    _clone_tree(entry.path, target)
+                else:
+                    _clone_file(entry.path, target)
+            except OSError as e:
+                logger.warning("Failed to copy %s: %s", entry.path, e)
+
+
+def _max_mtime(roots: tuple[Path, ...]) -> float:
+    """Return the newest mtime of the roots and everything below them (0 if none exist)."""
+    newest = 0.0
+    stack: list[str] = []
+    for root in roots:
+        try:
+            newest = max(newest, root.stat().st_mtime)
+        except OSError:
+            continue
+        stack.append(str(root))
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    newest = max(newest, entry.stat().st_mtime)
+                    if entry.is_dir():
+                        stack.append(entry.path)
+        except OSError:
+            continue
+    return newest
+
 
 class Session:
     """Represents a single agent session with its own working directory."""
@@ -35,8 +122,12 @@ class Session:
         sdk_session_id: str | None = None,
         db: SessionDatabase | None = None,
     ):
+        # get_info() result, rebuilt only after a change that it reports
+        self._info_cache: SessionInfo | None = None
+        self._info_dirty = True
         self.session_id = session_id
         self.working_directory = working_directory
+        self._wd_path = Path(working_directory)
         self.system_prompt = system_prompt
         self.allowed_tools = allowed_tools
         self.model = model
@@ -44,7 +135,10 @@ class Session:
         self.status = SessionStatus.ACTIVE
         self.created_at = created_at or datetime.now()
         self.last_activity = last_activity or datetime.now()
-        self.messages: list[ChatMessage] = []
+        # Chat history; None until loaded from the database (see messages)
+        self._messages: list[ChatMessage] | None = []
+        # Number of stored messages while _messages is not loaded yet
+        self._message_count = 0
         self.conversation_history: list[dict[str, Any]] = []
         self._lock = asyncio.Lock()
         # SDK session ID for multi-turn conversation
@@ -53,63 +147,204 @@ class Session:
         self.busy_since: datetime | None = None
         # Database reference for incremental saves
         self._db = db
+        # Messages not yet written to the database (flushed in batches)
+        self._pending_messages: list[tuple[str, str, datetime, list[dict[str, Any]] | None, str | None]] = []
+        # Called when a message is buffered; SessionManager uses it to wake
+        # its flusher. Without it messages are written through immediately.
+        self._on_pending: Callable[[], None] | None = None
+        # Bumped by clear_messages so rows taken before the clear are not
+        # put back into the buffer when their write fails
+        self._clear_generation = 0
+        # Called after last_activity changes; SessionManager uses it to keep
+        # its idle-cleanup heap current
+        self._on_activity: Callable[["Session"], None] | None = None
+        # Whether claude.md is present; set when it is copied or checked on load
+        self.claude_md_loaded = False
         
         # Create working directory for this session
-        Path(working_directory).mkdir(parents=True, exist_ok=True)
+        self._wd_path.mkdir(parents=True, exist_ok=True)
     
-    def delete_working_directory(self) -> bool:
+    async def delete_working_directory(self) -> bool:
         """Delete the session's working directory and all its contents."""
-        try:
-            if os.path.exists(self.working_directory):
-                shutil.rmtree(self.working_directory)
-                return True
+        if not self._wd_path.exists():
             return False
-        except Exception:
+        # Move the tree aside first so the session path disappears at once,
+        # however long removing node_modules and build output takes
+        # (uniquely named, so an earlier tombstone left behind can't make the move fail)
+        target = self._wd_path.with_name(f"{self._wd_path.name}.{uuid.uuid4().hex[:8]}.deleting")
+        try:
+            os.replace(self._wd_path, target)
+        except OSError:
+            target = self._wd_path
+        try:
+            if sys.platform == "win32":
+                await asyncio.to_thread(shutil.rmtree, target)
+            else:
+                proc = await asyncio.create_subprocess_exec(
+                    "rm", "-rf", str(target),
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                _, stderr = await proc.communicate()
+                if proc.returncode != 0:
+                    logger.error(
+                        "Failed to delete %s (rm exited with %s): %s",
+                        target, proc.returncode, stderr.decode(errors="replace").strip()[-500:],
+                    )
+                    return False
+            return True
+        except Exception as e:
+            logger.error("Failed to delete %s: %s", target, e)
             return False
     
-    def update_activity(self) -> None:
+    def update_activity(self, now: datetime | None = None) -> None:
         """Update the last activity timestamp."""
-        self.last_activity = datetime.now()
+        self.last_activity = now or datetime.now()
+        self.__dict__.pop("_last_activity_iso", None)
+        self._info_dirty = True
+        if self._on_activity:
+            self._on_activity(self)
+    
+    @property
+    def status(self) -> SessionStatus:
+        return self._status
+    
+    @status.setter
+    def status(self, value: SessionStatus) -> None:
+        self._status = value
+        self._info_dirty = True
+    
+    @property
+    def display_name(self) -> str | None:
+        return self._display_name
+    
+    @display_name.setter
+    def display_name(self, value: str | None) -> None:
+        self._display_name = value
+        self._info_dirty = True
+    
+    @property
+    def claude_md_loaded(self) -> bool:
+        return self._claude_md_loaded
+    
+    @claude_md_loaded.setter
+    def claude_md_loaded(self, value: bool) -> None:
+        self._claude_md_loaded = value
+        self._info_dirty = True
+    
+    @cached_property
+    def _created_at_iso(self) -> str:
+        return self.created_at.isoformat()
+    
+    @cached_property
+    def _last_activity_iso(self) -> str:
+        # Invalidated by update_activity()
+        return self.last_activity.isoformat()
+    
+    @property
+    def messages(self) -> list[ChatMessage]:
+        """Chat history, read from the messages table on first access."""
+        if self._messages is None:
+            self._messages = [
+                ChatMessage(
+                    role=msg_data["role"],
+                    content=msg_data["content"],
+                    timestamp=datetime.fromisoformat(msg_data["timestamp"]),
+                    tool_use=msg_data.get("tool_use"),
+                    thinking=msg_data.get("thinking"),
+                )
+                for msg_data in self._db.load_messages(self.session_id)
+            ]
+        return self._messages
+    
+    @property
+    def message_count(self) -> int:
+        """Number of messages, without loading the history."""
+        if self._messages is None:
+            return self._message_count
+        return len(self._messages)
     
     def add_message(self, role: str, content: str, tool_use: list[dict[str, Any]] | None = None, thinking: str | None = None) -> ChatMessage:
         """Add a message to the session history."""
+        now = datetime.now()
         message = ChatMessage(
             role=role,
             content=content,
-            timestamp=datetime.now(),
+            timestamp=now,
             tool_use=tool_use,
             thinking=thinking
         )
         self.messages.append(message)
-        self.update_activity()
+        self.update_activity(now)
         
-        # Save message to database immediately
+        # Buffer the row; it is written together with its neighbours and the
+        # timestamp is only formatted on the writer thread
         if self._db:
-            self._db.add_message(
-                session_id=self.session_id,
-                role=role,
-                content=content,
-                timestamp=message.timestamp.isoformat(),
-                tool_use=tool_use,
-                thinking=thinking
-            )
+            self._pending_messages.append((role, content, now, tool_use, thinking))
+            if self._on_pending:
+                self._on_pending()
+            else:
+                self.flush_messages()
         
         return message
     
+    def take_pending_messages(self) -> list[tuple]:
+        """Hand over the buffered rows; the caller is responsible for writing them."""
+        rows, self._pending_messages = self._pending_messages, []
+        return rows
+    
+    def flush_messages(self) -> None:
+        """Write all buffered messages to the database in one transaction."""
+        if not self._pending_messages or not self._db:
+            return
+        rows, self._pending_messages = self._pending_messages, []
+        try:
+            self._db.add_messages_bulk(self.session_id, rows)
+        except Exception as e:
+            # Keep the rows so the next flush retries them
+            self._pending_messages[:0] = rows
+            logger.warning("Failed to flush messages for session %s: %s", self.session_id, e)
+    
+    def _discard_pending_messages(self) -> None:
+        """Drop buffered messages (used when the session is deleted)."""
+        self._pending_messages.clear()
+    
+    def clear_messages(self) -> None:
+        """Remove all messages from memory and drop the unwritten ones.
+        
+        The database rows are deleted by SessionManager.clear_messages, which
+        orders the delete after any batch already queued for the writer.
+        """
+        self._discard_pending_messages()
+        self._clear_generation += 1
+        self._messages = []
+        self._info_dirty = True
+    
     def get_info(self) -> SessionInfo:
-        """Get session information."""
-        claude_md_loaded = Path(self.working_directory, "claude.md").exists()
-        return SessionInfo(
+        """Get session information.
+        
+        The result is cached until status, activity, messages, display name
+        or claude.md state change; treat it as read-only.
+        """
+        if not self._info_dirty and self._info_cache is not None:
+            return self._info_cache
+        self._info_dirty = False
+        self._info_cache = SessionInfo(
             session_id=self.session_id,
             working_directory=self.working_directory,
             status=self.status,
             created_at=self.created_at,
             last_activity=self.last_activity,
-            message_count=len(self.messages),
+            message_count=self.message_count,
             model=self.model,
             display_name=self.display_name,
-            claude_md_loaded=claude_md_loaded,
+            claude_md_loaded=self.claude_md_loaded,
         )
+        return self._info_cache
+    
+    def check_claude_md(self) -> None:
+        """Refresh claude_md_loaded from disk."""
+        self.claude_md_loaded = (self._wd_path / "claude.md").exists()
     
     def close(self) -> None:
         """Close the session."""
@@ -118,7 +353,7 @@ class Session:
         self.update_activity()
     
     def to_dict(self) -> dict[str, Any]:
-        """Convert session to dictionary for persistence."""
+        """Convert session to dictionary for persistence (messages are stored separately)."""
         return {
             "session_id": self.session_id,
             "working_directory": self.working_directory,
@@ -127,19 +362,9 @@ class Session:
             "model": self.model,
             "display_name": self.display_name,
             "status": self.status.value,
-            "created_at": self.created_at.isoformat(),
-            "last_activity": self.last_activity.isoformat(),
+            "created_at": self._created_at_iso,
+            "last_activity": self._last_activity_iso,
             "sdk_session_id": self.sdk_session_id,
-            "messages": [
-                {
-                    "role": msg.role,
-                    "content": msg.content,
-                    "timestamp": msg.timestamp.isoformat(),
-                    "tool_use": msg.tool_use,
-                    "thinking": msg.thinking,
-                }
-                for msg in self.messages
-            ],
         }
     
     @classmethod
@@ -158,17 +383,13 @@ class Session:
             db=db,
         )
         session.status = SessionStatus(data.get("status", "active"))
+        session.check_claude_md()
         
-        # Restore messages
-        for msg_data in data.get("messages", []):
-            message = ChatMessage(
-                role=msg_data["role"],
-                content=msg_data["content"],
-                timestamp=datetime.fromisoformat(msg_data["timestamp"]),
-                tool_use=msg_data.get("tool_use"),
-                thinking=msg_data.get("thinking"),
-            )
-            session.messages.append(message)
+        # Messages are loaded lazily from the messages table; the stored count
+        # (when the row came with one) is enough for get_info
+        if db:
+            session._messages = None
+            session._message_count = data.get("message_count", 0)
         
         return session
 
@@ -176,23 +397,52 @@ class Session:
 class SessionManager:
     """Manages multiple agent sessions with SQLite persistence."""
     
+    # Queued database writes are committed by the writer task in batches of
+    # up to this many calls per transaction.
+    WRITE_BATCH_SIZE = 64
+    # Buffered chat messages of all sessions are written at most this often (seconds)
+    MESSAGE_FLUSH_INTERVAL = 0.2
+    
     def __init__(self, base_workspace_dir: str | None = None):
         self._sessions: dict[str, Session] = {}
+        # Projection of _sessions without closed ones, kept in sync by _set_status
+        self._active_sessions: dict[str, Session] = {}
+        # Min-heap of (last_activity timestamp, session_id) for the idle sweep.
+        # Entries are pushed on every activity; outdated ones are skipped when popped.
+        self._activity_heap: list[tuple[float, str]] = []
+        # Guards adding/removing sessions and the periodic sweeps; lookups are
+        # lock-free and per-session changes use Session._lock
         self._lock = asyncio.Lock()
+        # Database writes are queued and committed by a single writer task
+        self._writer_queue: asyncio.Queue[tuple[Callable[..., Any], tuple, asyncio.Future]] = asyncio.Queue()
+        self._writer_task: asyncio.Task | None = None
+        # Set by Session.add_message (via _on_pending) to wake the message flusher
+        self._messages_pending = asyncio.Event()
+        self._flusher_task: asyncio.Task | None = None
         # Use .sessions directory in the current working directory (project root)
         if base_workspace_dir:
             self.base_workspace_dir = base_workspace_dir
         else:
             # Default to .sessions in the project directory
-            project_root = Path(__file__).parent.parent.parent
-            self.base_workspace_dir = str(project_root / ".sessions")
+            self.base_workspace_dir = str(_PROJECT_ROOT / ".sessions")
         Path(self.base_workspace_dir).mkdir(parents=True, exist_ok=True)
         
         # Initialize SQLite database
         self._db = SessionDatabase(os.path.join(self.base_workspace_dir, "sessions.db"))
         
+        # Global skills are laid out once here and cloned into each session;
+        # rebuilt whenever the source trees change (see _copy_global_skills)
+        self._skills_template_dir = Path(self.base_workspace_dir) / "_skills_template"
+        self._skills_template_mtime: float | None = None
+        self._skills_template_lock = threading.Lock()
+        # ((mtime_ns, size), content) of the project claude.md
+        self._claude_md_cache: tuple[tuple[int, int], bytes] | None = None
+        
         # Load existing sessions on startup
         self._load_sessions()
+        
+        # Last-chance write of buffered messages if the process exits without shutdown()
+        atexit.register(self.flush_pending_messages)
     
     def _load_sessions(self) -> None:
         """Load sessions from SQLite database with migration and recovery."""
@@ -203,159 +453,363 @@ class SessionManager:
             # Step 2: Load ALL sessions from database (including closed - user wants to see them)
             sessions_data = self._db.load_all_sessions(include_closed=True)
             
+            # One listing of the workspace serves both the existence checks
+            # below and orphan recovery
+            with os.scandir(self.base_workspace_dir) as it:
+                entries = list(it)
+            base_dir = os.path.abspath(self.base_workspace_dir)
+            dir_names = {entry.name for entry in entries if entry.is_dir()}
+            reactivated: list[str] = []
+            
             for session_data in sessions_data:
                 try:
-                    session = Session.from_dict(session_data, db=self._db)
                     # Only load sessions whose working directory still exists
-                    if os.path.exists(session.working_directory):
+                    # (checked before Session() would recreate it)
+                    parent, name = os.path.split(session_data["working_directory"])
+                    if parent == base_dir:
+                        exists = name in dir_names
+                    else:
+                        exists = os.path.isdir(session_data["working_directory"])
+                    if exists:
+                        session = Session.from_dict(session_data, db=self._db)
                         # Reactivate closed sessions - user should be able to continue
-                        if session.status == SessionStatus.CLOSED:
-                            session.status = SessionStatus.ACTIVE
-                            session.busy_since = None
-                            self._save_session(session)
                         # Busy sessions cannot resume after restart - recover to active
-                        if session.status == SessionStatus.BUSY:
+                        if session.status in (SessionStatus.CLOSED, SessionStatus.BUSY):
                             session.status = SessionStatus.ACTIVE
                             session.busy_since = None
-                            self._save_session(session)
-                        self._sessions[session.session_id] = session
+                            reactivated.append(session.session_id)
+                        self._add_session(session)
                 except Exception as e:
-                    print(f"Warning: Failed to load session {session_data.get('session_id')}: {e}")
+                    logger.warning("Failed to load session %s: %s", session_data.get("session_id"), e)
+            
+            # Persist all reactivations in one transaction
+            self._db.update_status_many(reactivated, SessionStatus.ACTIVE.value)
             
             # Step 3: Recover orphaned directories (exist on disk but not in DB)
-            self._recover_orphaned_sessions()
+            self._recover_orphaned_sessions(entries)
             
-            print(f"Loaded {len(self._sessions)} sessions from database")
+            logger.info("Loaded %d sessions from database", len(self._sessions))
         except Exception as e:
-            print(f"Warning: Failed to load sessions: {e}")
+            logger.warning("Failed to load sessions: %s", e)
     
     def _migrate_from_json(self) -> None:
-        """Migrate sessions from old JSON format to SQLite."""
+        """Migrate sessions from old JSON format to SQLite (runs once)."""
+        marker_path = os.path.join(self.base_workspace_dir, ".migrated_to_sqlite")
+        if os.path.exists(marker_path):
+            return
         json_path = os.path.join(self.base_workspace_dir, "_sessions.json")
         if not os.path.exists(json_path):
             return
         
         try:
-            with open(json_path, 'r') as f:
-                data = json.load(f)
+            with open(json_path, 'rb') as f:
+                data = json_loads(f.read())
             
-            sessions_list = data.get("sessions", [])
-            if not sessions_list:
-                return
+            def migrate_one(session_data: dict[str, Any]) -> None:
+                self._db.save_session(session_data)
+                self._db.add_messages_bulk(session_data["session_id"], [
+                    (
+                        msg["role"],
+                        msg["content"],
+                        msg["timestamp"],
+                        msg.get("tool_use"),
+                        msg.get("thinking"),
+                    )
+                    for msg in session_data.get("messages", [])
+                ])
             
-            migrated = 0
-            for session_data in sessions_list:
+            # One ID query up front, then every session in a single transaction
+            # (each in its own savepoint so a bad entry is skipped on its own)
+            known_ids = self._db.get_session_ids()
+            pending = []
+            for session_data in data.get("sessions", []):
                 session_id = session_data.get("session_id")
-                if session_id and not self._db.session_exists(session_id):
-                    try:
-                        self._db.save_session(session_data)
-                        migrated += 1
-                    except Exception as e:
-                        print(f"Warning: Failed to migrate session {session_id}: {e}")
+                if session_id and session_id not in known_ids:
+                    known_ids.add(session_id)
+                    pending.append(session_data)
+            errors = self._db.execute_batch([(migrate_one, (session_data,)) for session_data in pending])
+            migrated = 0
+            for session_data, error in zip(pending, errors):
+                if error is None:
+                    migrated += 1
+                else:
+                    logger.warning("Failed to migrate session %s: %s", session_data["session_id"], error)
             
             if migrated > 0:
-                print(f"Migrated {migrated} sessions from JSON to SQLite")
+                logger.info("Migrated %d sessions from JSON to SQLite", migrated)
             
-            # Clear the JSON sessions list after migration (keep file for backup)
-            data["sessions"] = []
-            data["migrated_to_sqlite"] = datetime.now().isoformat()
-            with open(json_path, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Keep the JSON file as a backup and never parse it again
+            os.replace(json_path, json_path + ".bak")
+            Path(marker_path).touch()
         except Exception as e:
-            print(f"Warning: Failed to migrate from JSON: {e}")
+            logger.warning("Failed to migrate from JSON: %s", e)
     
-    def _recover_orphaned_sessions(self) -> None:
-        """Recover sessions that exist on disk but not in database."""
+    def _recover_orphaned_sessions(self, entries: list[os.DirEntry]) -> None:
+        """Recover sessions that exist on disk (scandir entries of the workspace) but not in database."""
         try:
-            for item in os.listdir(self.base_workspace_dir):
-                item_path = os.path.join(self.base_workspace_dir, item)
+            known_ids = self._db.get_session_ids()
+            recovered: list[Session] = []
+            for entry in entries:
+                session_id = entry.name
                 # Skip non-directories and special files
-                if not os.path.isdir(item_path) or item.startswith('_') or item.endswith('.db'):
+                if session_id.startswith('_') or session_id.endswith(('.db', '.deleting')):
                     continue
-                
-                session_id = item
-                # Skip if already loaded
-                if session_id in self._sessions:
+                if not entry.is_dir():
                     continue
                 
-                # Skip if already in database
-                if self._db.session_exists(session_id):
+                # Skip if already loaded or already in database
+                if session_id in self._sessions or session_id in known_ids:
                     continue
                 
                 # Create a recovery session for this orphaned directory
                 try:
+                    st = entry.stat()
                     session = Session(
                         session_id=session_id,
-                        working_directory=item_path,
+                        working_directory=entry.path,
                         system_prompt="基于 claude.md 完成应用构建",
                         model="claude-sonnet-4-20250514",
                         display_name=None,
-                        created_at=datetime.fromtimestamp(os.path.getctime(item_path)),
-                        last_activity=datetime.fromtimestamp(os.path.getmtime(item_path)),
+                        created_at=datetime.fromtimestamp(st.st_ctime),
+                        last_activity=datetime.fromtimestamp(st.st_mtime),
                         db=self._db,
                     )
-                    self._sessions[session_id] = session
-                    self._db.save_session(session.to_dict())
-                    print(f"Recovered orphaned session: {session_id}")
+                    session.check_claude_md()
+                    recovered.append(session)
                 except Exception as e:
-                    print(f"Warning: Failed to recover session {session_id}: {e}")
+                    logger.warning("Failed to recover session %s: %s", session_id, e)
+            
+            # Insert all recovered sessions in one transaction
+            self._db.save_sessions_bulk([session.to_dict() for session in recovered])
+            for session in recovered:
+                self._add_session(session)
+                logger.info("Recovered orphaned session: %s", session.session_id)
         except Exception as e:
-            print(f"Warning: Failed to scan for orphaned sessions: {e}")
+            logger.warning("Failed to scan for orphaned sessions: %s", e)
     
-    def _save_session(self, session: Session) -> None:
-        """Save a single session to database."""
+    def _add_session(self, session: Session) -> None:
+        """Register a session in the ID map and, unless closed, the active index."""
+        self._sessions[session.session_id] = session
+        if session.status != SessionStatus.CLOSED:
+            self._active_sessions[session.session_id] = session
+        session._on_pending = self._wake_flusher
+        session._on_activity = self._track_activity
+        self._track_activity(session)
+    
+    def _track_activity(self, session: Session) -> None:
+        """Record a session's new last_activity in the idle heap."""
+        heapq.heappush(self._activity_heap, (session.last_activity.timestamp(), session.session_id))
+        # Drop outdated entries once they clearly outnumber the sessions
+        if len(self._activity_heap) > 2 * len(self._sessions) + 1024:
+            self._activity_heap = [
+                (s.last_activity.timestamp(), sid) for sid, s in self._sessions.items()
+            ]
+            heapq.heapify(self._activity_heap)
+    
+    def _set_status(self, session: Session, status: SessionStatus) -> None:
+        """Change a session's status and move it in or out of the active index."""
+        session.status = status
+        if status == SessionStatus.CLOSED:
+            self._active_sessions.pop(session.session_id, None)
+        else:
+            self._active_sessions[session.session_id] = session
+    
+    async def _submit(self, fn, *args) -> None:
+        """Queue a database write and wait until the writer task commits it."""
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._writer_loop())
+        future = asyncio.get_running_loop().create_future()
+        await self._writer_queue.put((fn, args, future))
+        await future
+    
+    async def _write(self, fn, *args) -> None:
+        """Like _submit, but log failures instead of raising."""
+        try:
+            await self._submit(fn, *args)
+        except Exception as e:
+            logger.warning("Database write %s failed for %s: %s", fn.__name__, args[0] if args else "?", e)
+    
+    def _wake_flusher(self) -> None:
+        """Signal that messages are buffered, starting the flusher on first use."""
         try:
-            self._db.save_session(session.to_dict())
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to flush on - write through
+            self.flush_pending_messages()
+            return
+        self._messages_pending.set()
+        if self._flusher_task is None or self._flusher_task.done():
+            self._flusher_task = loop.create_task(self._message_flusher())
+    
+    async def _message_flusher(self) -> None:
+        """Write buffered messages of all sessions every MESSAGE_FLUSH_INTERVAL while busy."""
+        while True:
+            await self._messages_pending.wait()
+            await asyncio.sleep(self.MESSAGE_FLUSH_INTERVAL)
+            self._messages_pending.clear()
+            await self._flush_messages()
+    
+    async def _flush_messages(self, sessions: list[Session] | None = None) -> None:
+        """Queue the buffered messages of the given (default: all) sessions and wait for the commit."""
+        if sessions is None:
+            sessions = list(self._sessions.values())
+        await asyncio.gather(*(
+            self._write_messages(session)
+            for session in sessions
+            if session._pending_messages
+        ))
+    
+    async def _write_messages(self, session: Session) -> None:
+        # Taking the rows and queueing them happens without yielding, so a
+        # concurrent clear either discards them or is queued behind them
+        rows = session.take_pending_messages()
+        if not rows:
+            return
+        generation = session._clear_generation
+        try:
+            await self._submit(self._db.add_messages_bulk, session.session_id, rows)
         except Exception as e:
-            print(f"Warning: Failed to save session {session.session_id}: {e}")
+            # Put the rows back so the next flush retries them, unless the
+            # history was cleared meanwhile
+            if session._clear_generation == generation:
+                session._pending_messages[:0] = rows
+            logger.warning("Failed to flush messages for session %s: %s", session.session_id, e)
+    
+    async def _writer_loop(self) -> None:
+        """Drain queued writes, committing each batch in one transaction off the loop."""
+        while True:
+            batch = [await self._writer_queue.get()]
+            while len(batch) < self.WRITE_BATCH_SIZE and not self._writer_queue.empty():
+                batch.append(self._writer_queue.get_nowait())
+            
+            try:
+                errors = await asyncio.to_thread(
+                    self._db.execute_batch, [(fn, args) for fn, args, _ in batch]
+                )
+            except Exception as e:
+                errors = [e] * len(batch)
+            
+            for (_, _, future), error in zip(batch, errors):
+                if not future.done():
+                    if error is None:
+                        future.set_result(None)
+                    else:
+                        future.set_exception(error)
+                self._writer_queue.task_done()
+    
+    async def shutdown(self) -> None:
+        """Persist buffered messages and queued writes, then close the database."""
+        # Everything is flushed below; don't keep this manager alive until exit
+        atexit.unregister(self.flush_pending_messages)
+        if self._flusher_task and not self._flusher_task.done():
+            self._flusher_task.cancel()
+            try:
+                await self._flusher_task
+            except asyncio.CancelledError:
+                pass
+        await self._flush_messages()
+        if self._writer_task and not self._writer_task.done():
+            await self._writer_queue.join()
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+        self._db.close()
     
-    def _copy_claude_md(self, working_directory: str) -> None:
+    async def _save_session(self, session: Session) -> None:
+        """Save a single session to database."""
+        await self._flush_messages([session])
+        await self._write(self._db.save_session, session.to_dict())
+    
+    async def _save_status(self, session: Session, with_activity: bool = False) -> None:
+        """Persist only the status column (and last_activity if requested)."""
+        await self._write(
+            self._db.update_status,
+            session.session_id,
+            session.status.value,
+            session._last_activity_iso if with_activity else None,
+        )
+    
+    async def _copy_claude_md(self, working_directory: Path) -> bool:
         """Copy claude.md from project root to session's working directory.
         
         Always overwrites to ensure the latest version is used.
+        Returns True if claude.md was copied.
         """
         try:
-            project_root = Path(__file__).parent.parent.parent
-            source = project_root / "claude.md"
-            dest = Path(working_directory) / "claude.md"
-            
-            if source.exists():
-                shutil.copy2(source, dest)
-                print(f"Copied claude.md to {working_directory}")
+            if await asyncio.to_thread(self._write_claude_md, working_directory / "claude.md"):
+                logger.info("Copied claude.md to %s", working_directory)
+                return True
         except Exception as e:
-            print(f"Warning: Failed to copy claude.md: {e}")
-
-    def _copy_global_skills(self, working_directory: str) -> None:
-        """Copy ~/.claude and ~/.agents skills/plugins into the session."""
+            logger.warning("Failed to copy claude.md: %s", e)
+        return False
+    
+    def _write_claude_md(self, dest: Path) -> bool:
+        """Write the project claude.md to dest, re-reading it only when it changed."""
         try:
-            session_dir = Path(working_directory)
+            st = _SOURCE_CLAUDE_MD.stat()
+        except FileNotFoundError:
+            return False
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._claude_md_cache
+        if cached is None or cached[0] != key:
+            cached = self._claude_md_cache = (key, _SOURCE_CLAUDE_MD.read_bytes())
+        dest.write_bytes(cached[1])
+        return True
 
-            def copy_tree(source: Path, dest: Path) -> None:
-                if not source.exists():
-                    return
-                if dest.exists():
-                    shutil.rmtree(dest)
-                dest.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copytree(source, dest)
+    def _copy_global_skills(self, working_directory: Path) -> None:
+        """Copy ~/.claude and ~/.agents skills/plugins into the session.
+        
+        The files are cloned (reflink or copy) from the skills template, which
+        is rebuilt only when the newest mtime under the source trees changes.
+        """
+        try:
+            with self._skills_template_lock:
+                template = self._skills_template_dir
+                mtime = _max_mtime(_SKILL_SOURCES)
+                if mtime != self._skills_template_mtime or not template.exists():
+                    self._build_skills_template(template)
+                    self._skills_template_mtime = mtime
+                
+                for name in (".claude", ".agents"):
+                    if (template / name).exists():
+                        _clone_tree(str(template / name), str(working_directory / name))
+            
+            logger.info("Copied global skills/plugins into %s", working_directory)
+        except Exception as e:
+            logger.warning("Failed to copy global skills: %s", e)
+    
+    def _build_skills_template(self, template: Path) -> None:
+        """Lay out ~/.claude and ~/.agents skills/plugins under the template directory.
+        
+        The template holds plain copies so that nothing cloned from it can
+        alias a file in the user's home directory.
+        """
+        if template.exists():
+            shutil.rmtree(template)
+        template.mkdir(parents=True)
 
-            # ~/.claude/skills and ~/.claude/plugins
-            home_claude = Path(os.path.expanduser("~/.claude"))
-            if home_claude.exists():
-                copy_tree(home_claude / "skills", session_dir / ".claude" / "skills")
-                copy_tree(home_claude / "plugins", session_dir / ".claude" / "plugins")
+        def copy_tree(source: Path, dest: Path) -> None:
+            if not source.exists():
+                return
+            if dest.exists():
+                shutil.rmtree(dest)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copytree(source, dest)
 
-            # ~/.agents/skills (common for Cursor skills)
-            home_agents = Path(os.path.expanduser("~/.agents"))
-            if home_agents.exists():
-                copy_tree(home_agents / "skills", session_dir / ".agents" / "skills")
-                # Also mirror into .claude/skills for compatibility if empty
-                claude_skills = session_dir / ".claude" / "skills"
-                if not claude_skills.exists() or not any(claude_skills.iterdir()):
-                    copy_tree(home_agents / "skills", claude_skills)
+        # ~/.claude/skills and ~/.claude/plugins
+        if _HOME_CLAUDE.exists():
+            copy_tree(_HOME_CLAUDE / "skills", template / ".claude" / "skills")
+            copy_tree(_HOME_CLAUDE / "plugins", template / ".claude" / "plugins")
 
-            print(f"Copied global skills/plugins into {session_dir}")
-        except Exception as e:
-            print(f"Warning: Failed to copy global skills: {e}")
+        # ~/.agents/skills (common for Cursor skills)
+        if _HOME_AGENTS.exists():
+            copy_tree(_HOME_AGENTS / "skills", template / ".agents" / "skills")
+            # Also mirror into .claude/skills for compatibility if empty
+            claude_skills = template / ".claude" / "skills"
+            if not claude_skills.exists() or not any(claude_skills.iterdir()):
+                copy_tree(_HOME_AGENTS / "skills", claude_skills)
     
     async def create_session(
         self,
@@ -381,142 +835,194 @@ class SessionManager:
             db=self._db,
         )
         
-        # Copy claude.md from project root to session directory
-        self._copy_claude_md(working_directory)
-        # Copy global skills into the session directory
-        self._copy_global_skills(working_directory)
+        # Copy claude.md and global skills into the session directory (off the
+        # event loop, on disjoint paths) while the row is inserted. The row is
+        # persisted before publishing so later updates always find it.
+        session.claude_md_loaded, _, _ = await asyncio.gather(
+            self._copy_claude_md(session._wd_path),
+            asyncio.to_thread(self._copy_global_skills, session._wd_path),
+            self._save_session(session),
+        )
         
         async with self._lock:
-            self._sessions[session_id] = session
-            self._save_session(session)
+            self._add_session(session)
         
         return session
     
     async def get_session(self, session_id: str) -> Session | None:
-        """Get a session by ID."""
-        async with self._lock:
-            return self._sessions.get(session_id)
+        """Get a session by ID.
+        
+        Lock-free: a dict lookup has no await point, so it cannot interleave
+        with a mutation on the event loop. Kept async for existing callers.
+        """
+        return self._sessions.get(session_id)
     
     async def list_sessions(self, include_closed: bool = False) -> list[Session]:
         """List all sessions."""
-        async with self._lock:
-            if include_closed:
-                return list(self._sessions.values())
-            return [s for s in self._sessions.values() if s.status != SessionStatus.CLOSED]
+        if include_closed:
+            return list(self._sessions.values())
+        return list(self._active_sessions.values())
+    
+    def iter_session_infos(self, include_closed: bool = False) -> Iterator[SessionInfo]:
+        """Yield the (cached) SessionInfo of each session without loading message histories."""
+        sessions = self._sessions if include_closed else self._active_sessions
+        for session in list(sessions.values()):
+            yield session.get_info()
     
     async def close_session(self, session_id: str) -> bool:
         """Close a session."""
-        async with self._lock:
-            session = self._sessions.get(session_id)
-            if session:
-                session.close()
-                self._save_session(session)
-                return True
+        session = self._sessions.get(session_id)
+        if not session:
             return False
+        async with session._lock:
+            session.close()
+            self._set_status(session, SessionStatus.CLOSED)
+        await self._flush_messages([session])
+        await self._save_status(session, with_activity=True)
+        return True
     
     async def delete_session(self, session_id: str, delete_directory: bool = True) -> bool:
         """Delete a session completely, including its working directory and Node-RED flow."""
         async with self._lock:
-            if session_id in self._sessions:
-                session = self._sessions[session_id]
-                
-                # Delete working directory if requested
-                if delete_directory:
-                    session.delete_working_directory()
-                
-                del self._sessions[session_id]
-                self._db.delete_session(session_id)
-                
-                # Delete corresponding Node-RED flow (async, don't block on failure)
-                try:
-                    flow_mgr = get_flow_manager()
-                    result = await flow_mgr.delete_flow(session_id)
-                    if result.get("success"):
-                        print(f"[SESSION] Deleted Node-RED flow for {session_id}")
-                    else:
-                        print(f"[SESSION] Flow delete note: {result.get('message')}")
-                except Exception as e:
-                    print(f"[SESSION] Failed to delete Node-RED flow: {e}")
-                
-                return True
+            session = self._sessions.pop(session_id, None)
+            if not session:
+                return False
+            self._active_sessions.pop(session_id, None)
+        session._discard_pending_messages()
+        await self._write(self._db.delete_session, session_id)
+        
+        # Delete working directory if requested (removed by an async rm -rf)
+        if delete_directory:
+            await session.delete_working_directory()
+        
+        # Delete corresponding Node-RED flow (async, don't block on failure)
+        try:
+            flow_mgr = get_flow_manager()
+            result = await flow_mgr.delete_flow(session_id)
+            if result.get("success"):
+                logger.info("Deleted Node-RED flow for %s", session_id)
+            else:
+                logger.info("Flow delete note: %s", result.get("message"))
+        except Exception as e:
+            logger.warning("Failed to delete Node-RED flow: %s", e)
+        
+        return True
+    
+    async def clear_messages(self, session_id: str) -> bool:
+        """Clear a session's history in memory and in the database."""
+        session = self._sessions.get(session_id)
+        if not session:
             return False
+        session.clear_messages()
+        # Goes through the writer queue so it commits after any message
+        # batch that was queued before the clear
+        await self._write(self._db.delete_messages, session_id)
+        return True
     
     async def save_session(self, session_id: str) -> bool:
-        """Explicitly save a session's state."""
-        async with self._lock:
-            if session_id in self._sessions:
-                self._save_session(self._sessions[session_id])
-                return True
+        """Explicitly save a session's state.
+        
+        Only the fields a conversation changes are written; the full row is
+        stored once on creation and by the targeted update methods.
+        """
+        session = self._sessions.get(session_id)
+        if not session:
             return False
+        await self._flush_messages([session])
+        await self._write(
+            self._db.update_session_state,
+            session_id,
+            session.status.value,
+            session._last_activity_iso,
+            session.sdk_session_id,
+        )
+        return True
+    
+    def flush_pending_messages(self) -> None:
+        """Synchronously write buffered messages of every session (exit fallback)."""
+        for session in list(self._sessions.values()):
+            session.flush_messages()
     
     async def update_sdk_session_id(self, session_id: str, sdk_session_id: str) -> bool:
         """Update SDK session ID for multi-turn conversations."""
-        async with self._lock:
-            session = self._sessions.get(session_id)
-            if session:
-                session.sdk_session_id = sdk_session_id
-                self._db.update_sdk_session_id(session_id, sdk_session_id)
-                return True
+        session = self._sessions.get(session_id)
+        if not session:
             return False
+        async with session._lock:
+            session.sdk_session_id = sdk_session_id
+        await self._write(self._db.update_sdk_session_id, session_id, sdk_session_id)
+        return True
 
     async def update_display_name(self, session_id: str, display_name: str | None) -> bool:
         """Update session display name."""
         normalized = display_name.strip() if display_name else None
         if normalized == "":
             normalized = None
-        async with self._lock:
-            session = self._sessions.get(session_id)
-            if session:
-                session.display_name = normalized
-                self._db.update_display_name(session_id, normalized)
-                return True
+        session = self._sessions.get(session_id)
+        if not session:
             return False
+        async with session._lock:
+            session.display_name = normalized
+        await self._write(self._db.update_display_name, session_id, normalized)
+        return True
 
     async def recover_session(self, session_id: str, reset_sdk: bool = False) -> Session | None:
         """Recover a session stuck in BUSY or otherwise unusable state."""
-        async with self._lock:
-            session = self._sessions.get(session_id)
-            if not session:
-                return None
-            session.status = SessionStatus.ACTIVE
+        session = self._sessions.get(session_id)
+        if not session:
+            return None
+        async with session._lock:
+            self._set_status(session, SessionStatus.ACTIVE)
             session.busy_since = None
             if reset_sdk:
                 session.sdk_session_id = None
-                self._db.update_sdk_session_id(session_id, None)
             session.update_activity()
-            self._save_session(session)
-            return session
+        if reset_sdk:
+            await self._write(self._db.update_sdk_session_id, session_id, None)
+        await self._save_status(session, with_activity=True)
+        return session
 
     async def recover_stuck_busy_sessions(self, max_busy_minutes: int = 30) -> list[str]:
         """Recover sessions that have been BUSY for too long."""
         now = datetime.now()
         recovered: list[str] = []
+        updates: list[tuple[str, str]] = []
         async with self._lock:
-            for session in self._sessions.values():
+            for session in self._active_sessions.values():
                 if session.status != SessionStatus.BUSY:
                     continue
                 since = session.busy_since or session.last_activity
                 busy_minutes = (now - since).total_seconds() / 60
                 if busy_minutes > max_busy_minutes:
-                    session.status = SessionStatus.ACTIVE
+                    self._set_status(session, SessionStatus.ACTIVE)
                     session.busy_since = None
-                    self._save_session(session)
                     recovered.append(session.session_id)
+                    updates.append((session.status.value, session.session_id))
+        # Persist outside the lock, one transaction for the whole batch
+        if updates:
+            await self._write(self._db.bulk_update_status, updates)
         return recovered
     
     async def cleanup_inactive_sessions(self, max_idle_minutes: int = 60) -> int:
         """Mark sessions as idle when they have been inactive for too long."""
-        now = datetime.now()
-        idle_count = 0
+        cutoff = datetime.now().timestamp() - max_idle_minutes * 60
+        updates: list[tuple[str, str]] = []
         
+        await self._flush_messages()
         async with self._lock:
-            for session in self._sessions.values():
-                if session.status != SessionStatus.CLOSED:
-                    idle_time = (now - session.last_activity).total_seconds() / 60
-                    if idle_time > max_idle_minutes:
-                        # Mark idle rather than closed to keep sessions visible/usable.
-                        session.status = SessionStatus.IDLE
-                        self._save_session(session)
-                        idle_count += 1
+            # Only the entries older than the cutoff are visited
+            heap = self._activity_heap
+            while heap and heap[0][0] < cutoff:
+                ts, session_id = heapq.heappop(heap)
+                session = self._active_sessions.get(session_id)
+                if not session or session.last_activity.timestamp() != ts:
+                    continue  # deleted/closed, or active again since this entry
+                # Mark idle rather than closed to keep sessions visible/usable.
+                self._set_status(session, SessionStatus.IDLE)
+                updates.append((session.status.value, session.session_id))
+        
+        # Persist outside the lock, one transaction for the whole batch
+        if updates:
+            await self._write(self._db.bulk_update_status, updates)
         
-        return idle_count
+        return len(updates)
@@ -1,236 +1,681 @@
 """View server management for session web projects (build mode only)."""
 
 import asyncio
+import hashlib
 import logging
-import json
 import time
 import os
 import shutil
 import signal
 import socket
-import subprocess
+import struct
+import sys
+import tempfile
+import threading
 import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
+from .database import json_loads
 from .flow import get_flow_manager
 
+# Directories never searched for a web project
+_SKIP_DIRS = frozenset({'node_modules', '.git', '.vite', 'dist', 'build', '__pycache__', '.next'})
+# Conventional web project directory names, in probe order
+_PREFERRED_DIR_NAMES = ('app', 'web', 'frontend', 'client')
+# package.json scripts/dependencies that mark a web project
+_BUILD_SCRIPTS = frozenset({'build', 'dev', 'start'})
+_WEB_DEPS = frozenset({'vite', 'react', 'vue', 'next', 'svelte'})
+# Build output directories, in priority order
+_BUILD_OUTPUT_DIRS = ('dist', 'build')
+# Keep installs quiet and cache-first
+_NPM_INSTALL_FLAGS = ("--prefer-offline", "--no-audit", "--no-fund")
+_NPM_ENV_OVERRIDES = {"npm_config_update_notifier": "false", "ADBLOCK": "1"}
+# SO_LINGER on with a zero timeout: close() sends RST
+_LINGER_RESET = struct.pack('ii', 1, 0)
 
-@dataclass
+
+async def _read_tail(stream: asyncio.StreamReader, limit: int = 8192) -> bytes:
+    """Drain a stream, keeping only its last `limit` bytes."""
+    tail = bytearray()
+    while chunk := await stream.read(65536):
+        tail += chunk
+        if len(tail) > limit:
+            del tail[:-limit]
+    return bytes(tail)
+
+
+def _read_file_tail(f, limit: int = 8192) -> bytes:
+    """Return the last `limit` bytes written to an open binary file."""
+    size = f.seek(0, os.SEEK_END)
+    f.seek(max(0, size - limit))
+    return f.read()
+
+
+# Directories left out of the downloadable build package
+_PACKAGE_SKIP_DIRS = frozenset({
+    "node_modules",
+    ".git",
+    ".vite",
+    "dist",
+    "build",
+    "__pycache__",
+    ".next",
+    ".cache",
+    ".claude",
+    ".agents",
+    ".sessions",
+    "artifacts",
+    "logs",
+})
+
+# Session files that never feed a build and change on every run
+_BUILD_CACHE_SKIP_EXTS = frozenset({".zip", ".log"})
+
+# Already-compressed formats that deflate cannot shrink
+_COMPRESSED_EXTS = frozenset({
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".ico",
+    ".woff", ".woff2", ".mp3", ".mp4", ".webm", ".zip", ".gz", ".br", ".7z",
+})
+
+# Files above this size are streamed by zipfile rather than read ahead into memory
+_PACKAGE_READ_LIMIT = 8 * 1024 * 1024
+
+
+def _iter_package_files(root: str) -> Iterator[tuple[str, str]]:
+    """Yield (path, path relative to root) for each file to package, skipping hidden entries."""
+    stack = [root]
+    while stack:
+        current_dir = stack.pop()
+        try:
+            with os.scandir(current_dir) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            name = entry.name
+            if name[:1] == ".":
+                continue
+            if entry.is_dir():
+                # Like os.walk, symlinked directories are not descended into
+                if name not in _PACKAGE_SKIP_DIRS and not entry.is_symlink():
+                    stack.append(entry.path)
+                continue
+            yield entry.path, os.path.relpath(entry.path, root)
+
+
+class _StaticHandler(SimpleHTTPRequestHandler):
+    """Serve a build directory like `serve -s --cors`: unknown paths fall back to index.html."""
+
+    # Don't let an idle client hold a handler thread in the API process
+    timeout = 30
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        if not os.path.isfile(path):
+            self.path = "/index.html"
+            path = self.translate_path(self.path)
+        # translate_path drops "..", but a symlink in the build output can still point elsewhere
+        root = os.path.realpath(self.directory)
+        if os.path.commonpath([root, os.path.realpath(path)]) != root:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        return super().send_head()
+
+    def list_directory(self, path):
+        self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+        return None
+
+    def end_headers(self):
+        self.send_header("Access-Control-Allow-Origin", "*")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        logging.getLogger("appbuilder.view").debug("static %s: " + format, self.server.server_port, *args)
+
+
+class _StaticServer(ThreadingHTTPServer):
+    """Threaded static file server for build output."""
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Liveness probes connect and reset without sending a request
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        logging.getLogger("appbuilder.view").warning(
+            "Static server error on port %s from %s", self.server_port, client_address, exc_info=True
+        )
+
+
+def _read_package_entry(file_path: str, arcname: str) -> tuple[zipfile.ZipInfo, Optional[bytes]]:
+    """Stat and read a file for the build package; large files are left for zipfile to stream."""
+    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    if zinfo.file_size > _PACKAGE_READ_LIMIT:
+        return zinfo, None
+    with open(file_path, "rb") as f:
+        return zinfo, f.read()
+
+
+@dataclass(slots=True, eq=False)
 class ViewServer:
     """Represents a running view server."""
     session_id: str
     port: int
-    process: Optional[subprocess.Popen]
+    process: Optional[asyncio.subprocess.Process]
     project_dir: str
     status: str  # 'building', 'running', 'stopped', 'error'
     error: Optional[str] = None
     candidates_found: List[str] = field(default_factory=list)
     package_path: Optional[str] = None
     package_error: Optional[str] = None
+    last_probe: float = 0.0
+    probe_task: Optional[asyncio.Task] = None
+    watch_task: Optional[asyncio.Task] = None
+    stderr_task: Optional[asyncio.Task] = None
+    package_checked_at: float = 0.0
+    package_exists: bool = False
+    static_server: Optional[ThreadingHTTPServer] = None
+    # Placeholder bind holding the port until the server launches
+    port_reservation: Optional[socket.socket] = None
+    # Whether this server still holds its bit in the port pool
+    owns_port: bool = False
 
 
 class ViewManager:
     """Manages view servers for session projects (build mode only)."""
     
+    HOST = '127.0.0.1'
     PORT_START = 4001
     PORT_END = 4100
+    PROBE_TIMEOUT = 0.1
+    PROBE_TTL = 1.0
+    MAX_SEARCH_DEPTH = 4
+    DISCOVERY_CACHE_SIZE = 128
+    PKG_JSON_CACHE_SIZE = 512
+    PACKAGE_CACHE_SIZE = 256
+    MAX_IDLE_SERVERS = 64
+    PACKAGE_READ_AHEAD = 32
+    PACKAGE_READY_TTL = 2.0
+    BUILD_CACHE_MAX_AGE = 7 * 24 * 3600
+    BUILD_CACHE_MAX_ENTRIES = 32
+    BUILD_CACHE_MAX_BYTES = 1 << 30
     
-    def __init__(self):
+    def __init__(self, build_cache_dir: Optional[str] = None):
         self._servers: Dict[str, ViewServer] = {}
-        self._used_ports: set[int] = set()
-        self._package_cache: Dict[str, dict] = {}
+        # Build outputs keyed by their inputs; set from the app's data dir at
+        # startup, caching is off while it is None
+        self.build_cache_dir: Optional[Path] = Path(build_cache_dir) if build_cache_dir else None
+        # Bit i set: PORT_START + i is held by exactly one ViewServer (its
+        # owns_port flag); only that server's _release_port clears the bit
+        self._used_mask = 0
+        self._port_cursor = 0
+        self._package_cache: OrderedDict[str, dict] = OrderedDict()
+        self._pkg_json_cache: Dict[str, tuple[tuple[int, int], Optional[dict]]] = {}
+        self._pkg_json_parsed: OrderedDict[bytes, Optional[dict]] = OrderedDict()
+        self._missing_pkg: set[str] = set()
+        # Discovery reads package.json files on _io_pool threads; guards the caches above
+        self._pkg_json_lock = threading.Lock()
+        self._discovery_cache: OrderedDict[str, tuple[List[tuple[str, int]], tuple[Optional[str], List[str]]]] = OrderedDict()
+        self._discovery_lock = threading.Lock()
         self._force_clean_build: set[str] = set()
         self._lock = asyncio.Lock()
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._inflight_starts: Dict[str, asyncio.Future] = {}
+        self._inflight_packages: Dict[str, asyncio.Future] = {}
+        self._serve_cmd: Optional[List[str]] = None
+        # Resolution of the `serve` binary, started by the first Next.js view
+        self._serve_resolution: Optional[asyncio.Future] = None
+        self._io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="view-scan")
         self._logger = logging.getLogger("appbuilder.view")
     
-    def _is_port_in_use(self, port: int) -> bool:
-        """Check if a port is currently in use."""
+    async def _is_port_in_use(self, port: int) -> bool:
+        """Check if something is accepting connections on a port."""
+        # A bare non-blocking connect; no stream reader/transport is needed just to probe
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(0.5)
-                result = s.connect_ex(('127.0.0.1', port))
-                return result == 0
-        except Exception:
+            await asyncio.wait_for(
+                asyncio.get_running_loop().sock_connect(sock, (self.HOST, port)),
+                timeout=self.PROBE_TIMEOUT
+            )
+        except (OSError, asyncio.TimeoutError):
             return False
+        else:
+            # Reset instead of FIN so repeated probes don't pile up TIME_WAIT entries
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RESET)
+            return True
+        finally:
+            sock.close()
+
+    def _bind_port(self, port: int) -> Optional[socket.socket]:
+        """Bind a port on HOST to hold it; None if it is taken."""
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind((self.HOST, port))
+        except OSError:
+            s.close()
+            return None
+        return s
     
-    def _find_available_port(self) -> int:
-        """Find an available port in the range."""
-        for port in range(self.PORT_START, self.PORT_END):
-            if port not in self._used_ports and not self._is_port_in_use(port):
-                return port
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        """Get the lock serializing start/stop/status for one session."""
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        return lock
+
+    def _allocate_port(self) -> tuple[int, socket.socket]:
+        """Take a free port from the pool; returns it with the socket holding it bound."""
+        span = self.PORT_END - self.PORT_START
+        free = ~self._used_mask & ((1 << span) - 1)
+        while free:
+            # Next-fit from the cursor, so a just-released port is reused last
+            ahead = free >> self._port_cursor << self._port_cursor
+            pick = ahead or free
+            idx = (pick & -pick).bit_length() - 1
+            free &= ~(1 << idx)
+            port = self.PORT_START + idx
+            reservation = self._bind_port(port)
+            if reservation is not None:
+                self._used_mask |= 1 << idx
+                self._port_cursor = (idx + 1) % span
+                return port, reservation
+            # Held by something outside this manager; skip it this round
         raise RuntimeError("No available ports for view server")
+
+    def _unbind_port(self, server: ViewServer) -> None:
+        """Drop the placeholder socket so the server process can bind the port."""
+        reservation, server.port_reservation = server.port_reservation, None
+        if reservation is not None:
+            reservation.close()
+
+    def _release_port(self, server: ViewServer) -> None:
+        """Return the server's port to the pool; a no-op once it has been released."""
+        self._unbind_port(server)
+        if not server.owns_port:
+            return
+        server.owns_port = False
+        if self.PORT_START <= server.port < self.PORT_END:
+            self._used_mask &= ~(1 << (server.port - self.PORT_START))
     
     def _read_package_json(self, project_dir: str) -> Optional[dict]:
-        """Read and parse package.json from a directory."""
+        """Read and parse package.json from a directory, cached by mtime and size."""
         package_json_path = os.path.join(project_dir, "package.json")
-        if not os.path.exists(package_json_path):
+        with self._pkg_json_lock:
+            if package_json_path in self._missing_pkg:
+                return None
+        try:
+            st = os.stat(package_json_path)
+        except FileNotFoundError:
+            with self._pkg_json_lock:
+                self._missing_pkg.add(package_json_path)
+                self._pkg_json_cache.pop(package_json_path, None)
+            return None
+        except OSError:
             return None
+        # Size catches rewrites within the filesystem's timestamp granularity
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._pkg_json_lock:
+            cached = self._pkg_json_cache.get(package_json_path)
+        if cached and cached[0] == stamp:
+            return cached[1]
         try:
-            with open(package_json_path, 'r') as f:
-                return json.load(f)
-        except Exception:
+            with open(package_json_path, 'rb') as f:
+                raw = f.read()
+        except OSError:
             return None
+        pkg = self._parse_package_json(raw)
+        with self._pkg_json_lock:
+            self._pkg_json_cache.pop(package_json_path, None)
+            self._pkg_json_cache[package_json_path] = (stamp, pkg)
+            if len(self._pkg_json_cache) > self.PKG_JSON_CACHE_SIZE:
+                # Dicts keep insertion order, so this drops the least recently parsed file
+                del self._pkg_json_cache[next(iter(self._pkg_json_cache))]
+        return pkg
     
-    def _has_build_script(self, project_dir: str) -> bool:
-        """Check if package.json has a build script."""
-        pkg = self._read_package_json(project_dir)
+    def _parse_package_json(self, raw: bytes) -> Optional[dict]:
+        """Parse package.json bytes, reusing the result for identical contents.
+
+        Touched-but-unchanged files and the same template copied into many sessions parse once.
+        """
+        digest = hashlib.blake2b(raw, digest_size=16).digest()
+        with self._pkg_json_lock:
+            if digest in self._pkg_json_parsed:
+                return self._pkg_json_parsed[digest]
+        try:
+            pkg = json_loads(raw)
+        except Exception:
+            pkg = None
+        if not isinstance(pkg, dict):
+            pkg = None
+        with self._pkg_json_lock:
+            self._pkg_json_parsed[digest] = pkg
+            if len(self._pkg_json_parsed) > self.PKG_JSON_CACHE_SIZE:
+                self._pkg_json_parsed.popitem(last=False)
+        return pkg
+
+    def _has_build_script(self, pkg: Optional[dict]) -> bool:
+        """Check if a parsed package.json has a build script."""
         if not pkg:
             return False
         scripts = pkg.get('scripts', {})
         return 'build' in scripts
     
-    def _is_web_project(self, project_dir: str) -> bool:
-        """Check if directory is a web project (has package.json with useful scripts or vite/react)."""
-        pkg = self._read_package_json(project_dir)
+    def _is_web_project(self, pkg: Optional[dict]) -> bool:
+        """Check if a parsed package.json looks like a web project (useful scripts or vite/react)."""
         if not pkg:
             return False
         
-        scripts = pkg.get('scripts', {})
-        deps = {**pkg.get('dependencies', {}), **pkg.get('devDependencies', {})}
-        
         # Has build/dev/start script
-        if any(s in scripts for s in ('build', 'dev', 'start')):
+        if not _BUILD_SCRIPTS.isdisjoint(pkg.get('scripts') or {}):
             return True
         
         # Has vite or react
-        if any(d in deps for d in ('vite', 'react', 'vue', 'next', 'svelte')):
-            return True
+        for key in ('dependencies', 'devDependencies'):
+            if not _WEB_DEPS.isdisjoint(pkg.get(key) or {}):
+                return True
         
         return False
     
-    def _find_project_dir(self, working_directory: str) -> tuple[Optional[str], List[str]]:
+    def _scan_dir(self, current_dir: str, depth: int) -> tuple[bool, List[str]]:
+        """Scan one directory, returning whether it has package.json and which subdirs to descend into."""
+        has_pkg = False
+        subdirs = []
+        descend = depth < self.MAX_SEARCH_DEPTH
+        with os.scandir(current_dir) as it:
+            for entry in it:
+                name = entry.name
+                if name == 'package.json':
+                    has_pkg = entry.is_file()
+                    continue
+                if not descend or name[:1] == '.' or name in _SKIP_DIRS:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+        if not has_pkg:
+            # Lets _read_package_json skip the stat until the next full search
+            with self._pkg_json_lock:
+                self._missing_pkg.add(os.path.join(current_dir, "package.json"))
+        return has_pkg, subdirs
+
+    def _score_candidate(self, path: str, depth: int) -> int:
+        """Score a package.json directory found `depth` levels below the working directory."""
+        score = 0
+        pkg = self._read_package_json(path)
+        if self._has_build_script(pkg):
+            score += 10
+        if self._is_web_project(pkg):
+            score += 5
+        # Prefer common names
+        if os.path.basename(path) in _PREFERRED_DIR_NAMES:
+            score += 3
+        # Prefer shallower paths (less nested = higher score)
+        score -= depth * 2
+        return score
+
+    def _scan_tree(
+        self,
+        root: str,
+        depth: int,
+        working_directory: str
+    ) -> tuple[List[tuple[int, str]], List[tuple[str, int]]]:
         """
-        Find the web project directory within the session's working directory.
-        Uses recursive traversal up to MAX_DEPTH levels.
-        Returns (project_dir, all_candidates_found).
+        Collect scored package.json directories under root, visiting in listing order.
+        Also returns the mtimes of every scanned directory and candidate package.json.
         """
-        MAX_DEPTH = 4
-        SKIP_DIRS = {'node_modules', '.git', '.vite', 'dist', 'build', '__pycache__', '.next'}
-        
         candidates = []
-        
-        print(f"[VIEW] Searching for project in: {working_directory}")
-        
-        if not os.path.exists(working_directory):
-            print(f"[VIEW] Working directory does not exist: {working_directory}")
-            return None, []
-        
-        def recursive_search(current_dir: str, depth: int):
-            """Recursively search for package.json files."""
-            if depth > MAX_DEPTH:
-                return
-            
+        stamps = []
+        stack = deque([(root, depth)])
+        while stack:
+            current_dir, depth = stack.pop()
             try:
-                # Check if current directory has package.json
-                pkg_path = os.path.join(current_dir, "package.json")
-                if os.path.exists(pkg_path):
-                    candidates.append(current_dir)
-                    rel_path = os.path.relpath(current_dir, working_directory)
-                    print(f"[VIEW] Found candidate: {rel_path}")
-                
-                # Continue searching subdirectories
-                for item in os.listdir(current_dir):
-                    if item.startswith('.') or item in SKIP_DIRS:
-                        continue
-                    item_path = os.path.join(current_dir, item)
-                    if os.path.isdir(item_path):
-                        recursive_search(item_path, depth + 1)
+                stamps.append((current_dir, os.stat(current_dir).st_mtime_ns))
+                has_pkg, subdirs = self._scan_dir(current_dir, depth)
+                if has_pkg:
+                    pkg_path = os.path.join(current_dir, "package.json")
+                    stamps.append((pkg_path, os.stat(pkg_path).st_mtime_ns))
             except PermissionError:
-                pass
+                continue
             except Exception as e:
-                print(f"[VIEW] Error searching {current_dir}: {e}")
+                self._logger.warning("Error searching %s: %s", current_dir, e)
+                continue
+            if has_pkg:
+                candidates.append((self._score_candidate(current_dir, depth), current_dir))
+                rel_path = os.path.relpath(current_dir, working_directory)
+                self._logger.debug("Found candidate: %s", rel_path)
+            # Push in reverse so directories are visited in listing order
+            for path in reversed(subdirs):
+                stack.append((path, depth + 1))
+        return candidates, stamps
+
+    def _cached_project_dir(self, working_directory: str) -> Optional[tuple[Optional[str], List[str]]]:
+        """Return a previous search result if nothing it looked at has changed since."""
+        with self._discovery_lock:
+            entry = self._discovery_cache.get(working_directory)
+            if entry is None:
+                return None
+            self._discovery_cache.move_to_end(working_directory)
+        stamps, (project_dir, candidates) = entry
+        for path, mtime_ns in stamps:
+            try:
+                if os.stat(path).st_mtime_ns != mtime_ns:
+                    return None
+            except OSError:
+                return None
+        return project_dir, list(candidates)
+
+    def _store_project_dir(
+        self,
+        working_directory: str,
+        stamps: List[tuple[str, int]],
+        result: tuple[Optional[str], List[str]]
+    ) -> tuple[Optional[str], List[str]]:
+        with self._discovery_lock:
+            self._discovery_cache[working_directory] = (stamps, (result[0], list(result[1])))
+            self._discovery_cache.move_to_end(working_directory)
+            while len(self._discovery_cache) > self.DISCOVERY_CACHE_SIZE:
+                self._discovery_cache.popitem(last=False)
+        return result
+
+    async def find_project_dir(self, working_directory: str) -> tuple[Optional[str], List[str]]:
+        """Find the web project directory without blocking the event loop."""
+        return await asyncio.to_thread(self._find_project_dir, working_directory)
+
+    def _find_conventional_project(
+        self,
+        working_directory: str
+    ) -> Optional[tuple[str, List[str], List[tuple[str, int]]]]:
+        """
+        Probe the working directory and its conventionally named children before walking.
+
+        A full-scoring project there (build script and web deps) outranks anything a walk
+        could find: an unprobed directory scores at most 15 - 2 at depth 1 and 18 - 2*2
+        deeper, so any probed score of 15 or more is final.
+        """
+        scored = []
+        stamps = []
+        for depth, path in [(0, working_directory)] + [
+            (1, os.path.join(working_directory, name)) for name in _PREFERRED_DIR_NAMES
+        ]:
+            pkg_path = os.path.join(path, "package.json")
+            try:
+                if depth:
+                    stamps.append((path, os.stat(path).st_mtime_ns))
+                stamps.append((pkg_path, os.stat(pkg_path).st_mtime_ns))
+            except OSError:
+                continue
+            scored.append((self._score_candidate(path, depth), path))
+        if not scored:
+            return None
+        scored.sort(key=lambda item: -item[0])
+        if scored[0][0] < 15:
+            return None
+        try:
+            stamps.insert(0, (working_directory, os.stat(working_directory).st_mtime_ns))
+        except OSError:
+            return None
+        return scored[0][1], [path for _, path in scored], stamps
+
+    def _find_project_dir(self, working_directory: str) -> tuple[Optional[str], List[str]]:
+        """
+        Find the web project directory within the session's working directory.
+        Searches up to MAX_SEARCH_DEPTH levels, scanning top-level subtrees in parallel.
+        Results are reused until a scanned directory or candidate package.json changes.
+        Returns (project_dir, all_candidates_found).
+        """
+        cached = self._cached_project_dir(working_directory)
+        if cached is not None:
+            self._logger.debug("Using cached project search for %s", working_directory)
+            return cached
+
+        self._logger.info("Searching for project in %s", working_directory)
+        # Files may have appeared since the last search
+        with self._pkg_json_lock:
+            self._missing_pkg.clear()
+
+        conventional = self._find_conventional_project(working_directory)
+        if conventional is not None:
+            best, candidates, stamps = conventional
+            self._logger.info("Selected project: %s (conventional location)", best)
+            return self._store_project_dir(working_directory, stamps, (best, candidates))
         
-        # Start recursive search
-        recursive_search(working_directory, 0)
+        try:
+            stamps = [(working_directory, os.stat(working_directory).st_mtime_ns)]
+            has_pkg, subdirs = self._scan_dir(working_directory, 0)
+            if has_pkg:
+                pkg_path = os.path.join(working_directory, "package.json")
+                stamps.append((pkg_path, os.stat(pkg_path).st_mtime_ns))
+        except FileNotFoundError:
+            self._logger.warning("Working directory does not exist: %s", working_directory)
+            return None, []
+        except OSError as e:
+            self._logger.warning("Error searching %s: %s", working_directory, e)
+            return None, []
+
+        candidates = [(self._score_candidate(working_directory, 0), working_directory)] if has_pkg else []
+        if has_pkg:
+            self._logger.debug("Found candidate: .")
+        # Independent subtrees are scanned concurrently; results keep listing order
+        futures = [
+            self._io_pool.submit(self._scan_tree, path, 1, working_directory)
+            for path in subdirs
+        ]
+        for future in futures:
+            subtree_candidates, subtree_stamps = future.result()
+            candidates.extend(subtree_candidates)
+            stamps.extend(subtree_stamps)
         
         if not candidates:
-            print(f"[VIEW] No package.json found (searched {MAX_DEPTH} levels deep)")
+            self._logger.info("No package.json found (searched %s levels deep)", self.MAX_SEARCH_DEPTH)
             # Check for static HTML
             if os.path.exists(os.path.join(working_directory, "index.html")):
-                print(f"[VIEW] Found static index.html")
-                return working_directory, [working_directory]
-            return None, []
+                self._logger.info("Found static index.html")
+                return self._store_project_dir(working_directory, stamps, (working_directory, [working_directory]))
+            return self._store_project_dir(working_directory, stamps, (None, []))
         
         # Sort candidates: prefer those with build scripts and web frameworks
-        def score_candidate(path: str) -> int:
-            score = 0
-            if self._has_build_script(path):
-                score += 10
-            if self._is_web_project(path):
-                score += 5
-            # Prefer common names
-            name = os.path.basename(path)
-            if name in ('web', 'frontend', 'app', 'client'):
-                score += 3
-            # Prefer shallower paths (less nested = higher score)
-            depth = path.replace(working_directory, '').count(os.sep)
-            score -= depth * 2
-            return score
-        
-        candidates.sort(key=score_candidate, reverse=True)
+        candidates.sort(key=lambda item: -item[0])
+        candidates = [path for _, path in candidates]
         
         best = candidates[0]
-        print(f"[VIEW] Selected project: {best} (from {len(candidates)} candidates)")
+        self._logger.info("Selected project: %s (from %s candidates)", best, len(candidates))
         
-        return best, candidates
+        return self._store_project_dir(working_directory, stamps, (best, candidates))
 
     def _find_uns_file(self, session_dir: str) -> Optional[str]:
         """Find uns.json within the session directory."""
-        base_dir = Path(session_dir)
         candidates = [
-            base_dir / "app" / "uns.json",
-            base_dir / "app" / "UNS.json",
-            base_dir / "app" / "public" / "uns.json",
-            base_dir / "app" / "public" / "UNS.json",
-            base_dir / "uns.json",
-            base_dir / "UNS.json",
+            os.path.join(session_dir, "app", "uns.json"),
+            os.path.join(session_dir, "app", "UNS.json"),
+            os.path.join(session_dir, "app", "public", "uns.json"),
+            os.path.join(session_dir, "app", "public", "UNS.json"),
+            os.path.join(session_dir, "uns.json"),
+            os.path.join(session_dir, "UNS.json"),
         ]
         for path in candidates:
-            if path.exists() and path.is_file():
-                return str(path)
-
-        matches: list[tuple[int, Path]] = []
-        for path in base_dir.rglob("*.json"):
-            if path.is_file() and path.name.lower() == "uns.json":
-                rel_depth = len(path.relative_to(base_dir).parts)
-                matches.append((rel_depth, path))
-        if matches:
-            matches.sort(key=lambda item: item[0])
-            return str(matches[0][1])
+            if os.path.isfile(path):
+                return path
+
+        # Breadth-first, so the first match is the shallowest one
+        queue = deque([session_dir])
+        while queue:
+            current_dir = queue.popleft()
+            try:
+                with os.scandir(current_dir) as it:
+                    for entry in it:
+                        name = entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            # uns.json may be copied into dist/build, so only
+                            # dependencies and hidden directories are pruned
+                            if name[:1] != '.' and name != 'node_modules':
+                                queue.append(entry.path)
+                        elif name.lower() == "uns.json" and entry.is_file():
+                            return entry.path
+            except OSError:
+                continue
 
         return None
 
-    def _find_flow_file(
+    def _flow_file_candidates(
         self,
         session_dir: str,
         project_dir: str,
         dist_dir: Optional[str]
-    ) -> Optional[str]:
-        """Find flow.json from common build/session locations."""
+    ) -> List[str]:
+        """List flow.json locations in priority order."""
         candidates = []
         if dist_dir:
-            candidates.append(Path(dist_dir) / "flow.json")
+            candidates.append(os.path.join(dist_dir, "flow.json"))
         candidates.extend([
-            Path(session_dir) / "dist" / "flow.json",
-            Path(session_dir) / "build" / "flow.json",
-            Path(project_dir) / "flow.json",
-            Path(session_dir) / "flow.json",
-            Path(session_dir) / "app" / "flow.json",
-            Path(session_dir) / "app" / "public" / "flow.json",
+            os.path.join(session_dir, "dist", "flow.json"),
+            os.path.join(session_dir, "build", "flow.json"),
+            os.path.join(project_dir, "flow.json"),
+            os.path.join(session_dir, "flow.json"),
+            os.path.join(session_dir, "app", "flow.json"),
+            os.path.join(session_dir, "app", "public", "flow.json"),
         ])
-        for path in candidates:
-            if path.exists() and path.is_file():
-                return str(path)
+        return candidates
+
+    def _find_flow_file(
+        self,
+        session_dir: str,
+        project_dir: str,
+        dist_dir: Optional[str]
+    ) -> Optional[str]:
+        """Find flow.json from common build/session locations."""
+        for path in self._flow_file_candidates(session_dir, project_dir, dist_dir):
+            if os.path.isfile(path):
+                return path
         return None
 
+    async def _locate_flow_file(
+        self,
+        session_dir: str,
+        project_dir: str,
+        dist_dir: Optional[str]
+    ) -> Optional[str]:
+        """Run _find_flow_file off the event loop, checking every location in one worker call."""
+        return await asyncio.to_thread(self._find_flow_file, session_dir, project_dir, dist_dir)
+
     def _find_build_output_dir(self, project_dir: str) -> Optional[str]:
         """Find build output directory (dist/build)."""
-        for dir_name in ("dist", "build"):
-            dir_path = os.path.join(project_dir, dir_name)
-            if os.path.exists(dir_path):
-                return dir_path
+        try:
+            with os.scandir(project_dir) as it:
+                present = {entry.name for entry in it if entry.name in _BUILD_OUTPUT_DIRS and entry.is_dir()}
+        except OSError:
+            return None
+        for dir_name in _BUILD_OUTPUT_DIRS:
+            if dir_name in present:
+                return os.path.join(project_dir, dir_name)
         return None
 
     def _create_build_package(
@@ -247,33 +692,28 @@ class ViewManager:
         package_path = os.path.join(artifacts_dir, f"{session_id}-build.zip")
 
         try:
-            with zipfile.ZipFile(package_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as zipf:
-                skip_dirs = {
-                    "node_modules",
-                    ".git",
-                    ".vite",
-                    "dist",
-                    "build",
-                    "__pycache__",
-                    ".next",
-                    ".cache",
-                    ".claude",
-                    ".agents",
-                    ".sessions",
-                    "artifacts",
-                    "logs",
-                }
-                for root, dirs, files in os.walk(project_dir):
-                    dirs[:] = [
-                        d for d in dirs
-                        if d not in skip_dirs and not d.startswith(".")
-                    ]
-                    for file in files:
-                        if file.startswith("."):
-                            continue
-                        file_path = os.path.join(root, file)
-                        rel_path = os.path.relpath(file_path, project_dir)
-                        zipf.write(file_path, os.path.join("frontend", rel_path))
+            # Level 1: packaging runs on every build, so favour speed over a few percent of size
+            with zipfile.ZipFile(package_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True, compresslevel=1) as zipf:
+                # Read files ahead on the pool while this thread deflates (zlib releases the GIL)
+                pending: deque = deque()
+
+                def write_next() -> None:
+                    file_path, arcname, future = pending.popleft()
+                    zinfo, data = future.result()
+                    ext = os.path.splitext(arcname)[1].lower()
+                    compress_type = zipfile.ZIP_STORED if ext in _COMPRESSED_EXTS else zipfile.ZIP_DEFLATED
+                    if data is None:
+                        zipf.write(file_path, arcname, compress_type=compress_type)
+                    else:
+                        zipf.writestr(zinfo, data, compress_type=compress_type, compresslevel=1)
+
+                for file_path, rel_path in _iter_package_files(project_dir):
+                    arcname = os.path.join("frontend", rel_path)
+                    pending.append((file_path, arcname, self._io_pool.submit(_read_package_entry, file_path, arcname)))
+                    if len(pending) >= self.PACKAGE_READ_AHEAD:
+                        write_next()
+                while pending:
+                    write_next()
 
                 uns_path = self._find_uns_file(session_dir)
                 if uns_path:
@@ -287,6 +727,31 @@ class ViewManager:
 
         return package_path, None
 
+    async def _package_once(
+        self,
+        session_id: str,
+        session_dir: str,
+        project_dir: str,
+        dist_dir: Optional[str]
+    ) -> tuple[Optional[str], Optional[str]]:
+        """Build a session's package off the event loop.
+
+        Concurrent callers share one in-flight build, so the same zip is never written twice at once.
+        """
+        task = self._inflight_packages.get(session_id)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(
+                self._create_build_package, session_id, session_dir, project_dir, dist_dir
+            ))
+            self._inflight_packages[session_id] = task
+
+            def _done(finished: asyncio.Future) -> None:
+                if self._inflight_packages.get(session_id) is finished:
+                    del self._inflight_packages[session_id]
+
+            task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
     def _cache_package(
         self,
         session_id: str,
@@ -299,19 +764,86 @@ class ViewManager:
             "package_path": package_path,
             "package_error": package_error,
         }
+        self._package_cache.move_to_end(session_id)
+        while len(self._package_cache) > self.PACKAGE_CACHE_SIZE:
+            self._package_cache.popitem(last=False)
+
+    def _get_cached_package(self, session_id: str) -> Optional[dict]:
+        """Look up a session's package info, marking it recently used."""
+        cached = self._package_cache.get(session_id)
+        if cached is not None:
+            self._package_cache.move_to_end(session_id)
+        return cached
+
+    def _register_server(self, server: ViewServer) -> None:
+        """Track a server, dropping the oldest stopped/errored entries beyond MAX_IDLE_SERVERS."""
+        self._servers[server.session_id] = server
+        idle = [
+            session_id for session_id, other in self._servers.items()
+            if other.status in ('stopped', 'error')
+            and (other.process is None or other.process.returncode is not None)
+            and other.static_server is None
+        ]
+        for session_id in idle[:max(0, len(idle) - self.MAX_IDLE_SERVERS)]:
+            del self._servers[session_id]
     
-    async def _verify_port_listening(self, port: int, timeout: float = 10.0) -> bool:
-        """Wait for a port to start listening."""
-        start_time = asyncio.get_event_loop().time()
-        while asyncio.get_event_loop().time() - start_time < timeout:
-            if self._is_port_in_use(port):
-                return True
-            await asyncio.sleep(0.5)
-        return False
+    async def _verify_port_listening(
+        self,
+        port: int,
+        timeout: float = 10.0,
+        process: Optional[asyncio.subprocess.Process] = None
+    ) -> bool:
+        """Wait for a port to start listening, backing off between probes.
+
+        If a process is given, gives up as soon as it exits.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = 0.025
+        exited = asyncio.ensure_future(process.wait()) if process else None
+        try:
+            while True:
+                if await self._is_port_in_use(port):
+                    return True
+                remaining = deadline - loop.time()
+                if remaining <= 0 or (exited and exited.done()):
+                    return False
+                if exited:
+                    await asyncio.wait({exited}, timeout=min(delay, remaining))
+                else:
+                    await asyncio.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.2)
+        finally:
+            if exited and not exited.done():
+                exited.cancel()
+
+    async def _watch_process(self, server: ViewServer, process: asyncio.subprocess.Process) -> None:
+        """Mark a server stopped as soon as its process exits."""
+        await process.wait()
+        if server.process is process and server.status in ('building', 'running'):
+            self._logger.warning("Static server for %s exited with code %s", server.session_id, process.returncode)
+            server.status = 'stopped'
+            self._release_port(server)
     
     async def start_view(self, session_id: str, working_directory: str) -> ViewServer:
-        """Start a view server for a session (always uses build mode)."""
-        async with self._lock:
+        """Start a view server for a session (always uses build mode).
+
+        Concurrent calls for the same session share one in-flight start.
+        """
+        task = self._inflight_starts.get(session_id)
+        if task is None:
+            task = asyncio.ensure_future(self._start_view(session_id, working_directory))
+            self._inflight_starts[session_id] = task
+
+            def _done(finished: asyncio.Future) -> None:
+                if self._inflight_starts.get(session_id) is finished:
+                    del self._inflight_starts[session_id]
+
+            task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    async def _start_view(self, session_id: str, working_directory: str) -> ViewServer:
+        async with self._session_lock(session_id):
             # Clean up any existing server for this session
             if session_id in self._servers:
                 server = self._servers[session_id]
@@ -320,8 +852,10 @@ class ViewManager:
                     if server.status == 'building':
                         self._logger.info("Build already in progress for %s, reusing current build", session_id)
                         return server
-                    if server.process and server.process.poll() is None:
-                        if self._is_port_in_use(server.port):
+                    if server.static_server is not None or (
+                        server.process and server.process.returncode is None
+                    ):
+                        if await self._is_port_in_use(server.port):
                             self._logger.info("Reusing existing server for %s on port %s", session_id, server.port)
                             return server
                 # Clean up old state
@@ -329,7 +863,7 @@ class ViewManager:
                 del self._servers[session_id]
             
             # Find project directory
-            project_dir, candidates = self._find_project_dir(working_directory)
+            project_dir, candidates = await self.find_project_dir(working_directory)
             
             if not project_dir:
                 error_msg = f'No package.json found. Searched in: {working_directory}'
@@ -343,7 +877,7 @@ class ViewManager:
                     error=error_msg,
                     candidates_found=candidates
                 )
-                self._servers[session_id] = server
+                self._register_server(server)
                 return server
             
             force_clean_build = session_id in self._force_clean_build
@@ -351,8 +885,7 @@ class ViewManager:
                 self._force_clean_build.discard(session_id)
 
             # Allocate port
-            port = self._find_available_port()
-            self._used_ports.add(port)
+            port, reservation = self._allocate_port()
             
             server = ViewServer(
                 session_id=session_id,
@@ -360,9 +893,11 @@ class ViewManager:
                 process=None,
                 project_dir=project_dir,
                 status='building',
-                candidates_found=candidates
+                candidates_found=candidates,
+                port_reservation=reservation,
+                owns_port=True
             )
-            self._servers[session_id] = server
+            self._register_server(server)
         
         # Build in background to keep API responsive
         async def run_build():
@@ -372,11 +907,45 @@ class ViewManager:
                 self._logger.error("Background build error for %s: %s", server.session_id, e)
                 server.status = 'error'
                 server.error = str(e)
-                self._used_ports.discard(server.port)
+                self._release_port(server)
         
         asyncio.create_task(run_build())
         return server
     
+    async def _ensure_serve_resolved(self) -> None:
+        """Resolve the `serve` binary on first use; later and concurrent callers share the result."""
+        if self._serve_resolution is None:
+            self._serve_resolution = asyncio.ensure_future(self._resolve_serve())
+        await asyncio.shield(self._serve_resolution)
+
+    async def _resolve_serve(self) -> None:
+        """Look up the `serve` binary so view starts skip npx package resolution."""
+        path = shutil.which("serve")
+        if not path:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    "npx", "--yes", "--package", "serve", "-c", "command -v serve",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                stdout, _ = await asyncio.wait_for(process.communicate(), timeout=120)
+                if process.returncode == 0:
+                    path = stdout.decode().strip().splitlines()[-1] if stdout.strip() else None
+            except asyncio.TimeoutError:
+                process.kill()
+                self._logger.warning("Timed out resolving serve binary, falling back to npx")
+            except Exception as e:
+                self._logger.warning("Failed to resolve serve binary: %s", e)
+        if path and os.path.isfile(path):
+            self._serve_cmd = [path]
+            self._logger.info("Using static server binary %s", path)
+
+    def _serve_command(self) -> List[str]:
+        """Command prefix used to launch the static server."""
+        if self._serve_cmd and os.path.isfile(self._serve_cmd[0]):
+            return self._serve_cmd
+        return ["npx", "serve"]
+    
     async def _import_session_flow(
         self,
         session_id: str,
@@ -385,23 +954,351 @@ class ViewManager:
         dist_dir: Optional[str]
     ) -> None:
         """Import flow.json into Node-RED if it exists."""
-        flow_json_path = self._find_flow_file(session_dir, project_dir, dist_dir)
+        flow_json_path = await self._locate_flow_file(session_dir, project_dir, dist_dir)
         if not flow_json_path:
-            print(f"[VIEW] No flow.json found for {session_id}")
+            self._logger.info("No flow.json found for %s", session_id)
             return
-        print(f"[VIEW] Found flow.json at {flow_json_path}, importing to Node-RED...")
+        self._logger.info("Found flow.json at %s, importing to Node-RED", flow_json_path)
         
         try:
             flow_mgr = get_flow_manager()
             result = await flow_mgr.import_flow_from_file(session_id, flow_json_path)
             
             if result.get("success"):
-                print(f"[VIEW] Flow imported successfully: {result.get('message')}")
+                self._logger.info("Flow imported successfully: %s", result.get('message'))
             else:
-                print(f"[VIEW] Flow import failed: {result.get('message')}")
+                self._logger.warning("Flow import failed: %s", result.get('message'))
         except Exception as e:
-            print(f"[VIEW] Error importing flow: {e}")
+            self._logger.error("Error importing flow for %s: %s", session_id, e)
     
+    def _build_cache_key(self, project_dir: str) -> Optional[str]:
+        """Hash the build inputs: package manifests plus every source file's size and mtime.
+        
+        Dot directories, build outputs and session-only directories (artifacts,
+        logs) are skipped, so a project at the session root keeps its key
+        across runs. node_modules is represented by its install marker, so a
+        reinstall (which may resolve other versions without a lockfile)
+        changes the key.
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for name in ("package-lock.json", "package.json"):
+            try:
+                with open(os.path.join(project_dir, name), 'rb') as f:
+                    h.update(name.encode() + b"\0" + f.read())
+            except FileNotFoundError:
+                continue
+            except OSError:
+                return None
+        try:
+            with open(os.path.join(project_dir, "node_modules", ".nm-hash"), 'rb') as f:
+                h.update(b".nm-hash\0" + f.read() + f"\0{os.fstat(f.fileno()).st_mtime_ns}\n".encode())
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return None
+        for root, dirs, files in os.walk(project_dir):
+            dirs[:] = sorted(d for d in dirs if d[:1] != '.' and d not in _PACKAGE_SKIP_DIRS)
+            for name in sorted(files):
+                if os.path.splitext(name)[1] in _BUILD_CACHE_SKIP_EXTS:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                rel_path = os.path.relpath(path, project_dir)
+                h.update(f"{rel_path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+        return h.hexdigest()
+
+    def _restore_cached_build(self, cache_key: str, project_dir: str, session_id: str) -> bool:
+        """Copy a cached build output into the project; returns False on a miss."""
+        entry = self.build_cache_dir / cache_key
+        for name in ("dist", "build"):
+            cached = entry / name
+            if not cached.is_dir():
+                continue
+            target = os.path.join(project_dir, name)
+            try:
+                if os.path.exists(target):
+                    shutil.rmtree(target)
+                # Copy rather than link: flow/UNS restoration writes into the output
+                shutil.copytree(cached, target)
+                self._add_cache_owner(entry, session_id)
+                os.utime(entry)
+                return True
+            except Exception as e:
+                self._logger.warning("Failed to restore cached build %s: %s", cache_key, e)
+                return False
+        return False
+
+    def _store_cached_build(
+        self, cache_key: str, project_dir: str, session_id: str, replace: bool = False
+    ) -> None:
+        """Save a fresh build output under its cache key and evict old entries.
+        
+        An existing entry is only rewritten when replace is set, and outputs
+        larger than BUILD_CACHE_MAX_BYTES are not cached at all.
+        """
+        output_dir = self._find_build_output_dir(project_dir)
+        if not output_dir:
+            return
+        entry = self.build_cache_dir / cache_key
+        if entry.is_dir() and not replace:
+            try:
+                self._add_cache_owner(entry, session_id)
+                os.utime(entry)
+            except OSError:
+                pass  # Evicted meanwhile
+            return
+        if self._tree_size(output_dir) > self.BUILD_CACHE_MAX_BYTES:
+            return
+        if replace:
+            shutil.rmtree(entry, ignore_errors=True)
+        staging = self.build_cache_dir / f".{cache_key}.{os.getpid()}.tmp"
+        try:
+            shutil.rmtree(staging, ignore_errors=True)
+            shutil.copytree(output_dir, staging / os.path.basename(output_dir))
+            self._add_cache_owner(staging, session_id)
+            os.replace(staging, entry)
+        except OSError as e:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not entry.is_dir():
+                self._logger.warning("Failed to cache build %s: %s", cache_key, e)
+            return
+
+        self._evict_cached_builds()
+
+    def _evict_cached_builds(self) -> None:
+        """Drop expired entries, then the least recently used ones beyond the entry and size caps."""
+        cutoff = time.time() - self.BUILD_CACHE_MAX_AGE
+        entries: List[tuple[float, str]] = []
+        with os.scandir(self.build_cache_dir) as it:
+            for item in it:
+                try:
+                    if not item.is_dir() or item.name[:1] == '.':
+                        continue
+                    mtime = item.stat().st_mtime
+                except OSError:
+                    continue
+                if mtime < cutoff:
+                    shutil.rmtree(item.path, ignore_errors=True)
+                else:
+                    entries.append((mtime, item.path))
+
+        # Newest first; keep entries until either cap is reached
+        entries.sort(reverse=True)
+        total = 0
+        for index, (_, path) in enumerate(entries):
+            total += self._tree_size(path)
+            if index >= self.BUILD_CACHE_MAX_ENTRIES or total > self.BUILD_CACHE_MAX_BYTES:
+                shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def _add_cache_owner(entry: Path, session_id: str) -> None:
+        """Record that a session uses a cache entry (an empty file under .owners)."""
+        owners = entry / ".owners"
+        owners.mkdir(exist_ok=True)
+        (owners / session_id).touch()
+
+    def _remove_cached_builds(self, session_id: str) -> None:
+        """Drop a session's ownership of cache entries, deleting those no other session uses."""
+        try:
+            with os.scandir(self.build_cache_dir) as it:
+                entries = [item.path for item in it if item.name[:1] != '.' and item.is_dir()]
+        except FileNotFoundError:
+            return
+        for path in entries:
+            owners = os.path.join(path, ".owners")
+            try:
+                os.unlink(os.path.join(owners, session_id))
+            except FileNotFoundError:
+                continue
+            try:
+                os.rmdir(owners)
+            except OSError:
+                continue  # Still used by another session
+            shutil.rmtree(path, ignore_errors=True)
+
+    async def remove_cached_builds(self, session_id: str) -> None:
+        """Remove the cached builds of a deleted session."""
+        if self.build_cache_dir is not None:
+            await asyncio.to_thread(self._remove_cached_builds, session_id)
+
+    @staticmethod
+    def _tree_size(path: str) -> int:
+        """Total size in bytes of the regular files under path."""
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.stat(os.path.join(root, name)).st_size
+                except OSError:
+                    continue
+        return total
+
+    def _stash_artifact(self, src: str, backup_dir: str, name: str) -> Optional[str]:
+        """Hardlink (or copy across filesystems) an artifact into the backup dir."""
+        dst = os.path.join(backup_dir, name)
+        os.makedirs(backup_dir, exist_ok=True)
+        try:
+            os.unlink(dst)
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(src, dst)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            shutil.copy2(src, dst)
+        return dst
+
+    def _stash_prebuild_artifacts(
+        self,
+        flow_candidates: List[str],
+        session_dir: str
+    ) -> tuple[Optional[str], Optional[str]]:
+        """Stash flow.json and uns.json before a build; returns (flow backup, uns backup)."""
+        backup_dir = os.path.join(session_dir, ".view-prebuild")
+        flow_backup = uns_backup = None
+        for candidate in flow_candidates:
+            try:
+                flow_backup = self._stash_artifact(candidate, backup_dir, "flow.json")
+            except OSError:
+                continue
+            if flow_backup:
+                break
+        uns_path = self._find_uns_file(session_dir)
+        if uns_path:
+            try:
+                uns_backup = self._stash_artifact(uns_path, backup_dir, os.path.basename(uns_path))
+            except OSError:
+                pass
+        return flow_backup, uns_backup
+
+    def _restore_artifact(self, backup: str, dst: str) -> None:
+        """Move a stashed artifact into place; copy instead if it still shares an inode with its source."""
+        try:
+            if os.path.samefile(backup, dst):
+                os.unlink(backup)
+                return
+        except FileNotFoundError:
+            pass
+        if os.stat(backup).st_nlink > 1:
+            shutil.copy2(backup, dst)
+            os.unlink(backup)
+            return
+        try:
+            os.replace(backup, dst)
+        except OSError:
+            shutil.copy2(backup, dst)
+            os.unlink(backup)
+
+    async def _clean_build_output(self, project_dir: str, session_id: str) -> None:
+        """Remove dist/ and build/ concurrently, off the event loop."""
+        paths = [os.path.join(project_dir, name) for name in ("dist", "build")]
+        paths = [path for path in paths if os.path.exists(path)]
+        results = await asyncio.gather(
+            *(asyncio.to_thread(shutil.rmtree, path) for path in paths),
+            return_exceptions=True
+        )
+        for path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                self._logger.warning("Failed to clean %s for %s: %s", path, session_id, result)
+
+    def _manifest_hash(self, project_dir: str) -> str:
+        """Hash package.json and package-lock.json (if any) to identify an installed tree."""
+        digest = hashlib.blake2b(digest_size=16)
+        for name in ("package.json", "package-lock.json"):
+            try:
+                with open(os.path.join(project_dir, name), "rb") as f:
+                    digest.update(f.read())
+            except OSError:
+                pass
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _install_command(self, project_dir: str) -> List[str]:
+        """Use `npm ci` when a lockfile pins the tree, else `npm install`."""
+        if os.path.isfile(os.path.join(project_dir, "package-lock.json")):
+            return ["npm", "ci", *_NPM_INSTALL_FLAGS, "--loglevel=error"]
+        return ["npm", "install", *_NPM_INSTALL_FLAGS]
+
+    def _needs_install(self, project_dir: str) -> bool:
+        """Check whether node_modules is missing or was installed from different manifests."""
+        node_modules = os.path.join(project_dir, "node_modules")
+        if not os.path.isdir(node_modules):
+            return True
+        try:
+            with open(os.path.join(node_modules, ".nm-hash"), encoding="utf-8") as f:
+                installed = f.read().strip()
+        except FileNotFoundError:
+            # Installed before hashes were recorded: reinstall only if npm's own
+            # hidden lockfile predates package-lock.json, else adopt the tree
+            try:
+                stale = (
+                    os.stat(os.path.join(node_modules, ".package-lock.json")).st_mtime_ns
+                    < os.stat(os.path.join(project_dir, "package-lock.json")).st_mtime_ns
+                )
+            except OSError:
+                stale = False
+            if stale:
+                return True
+            self._write_install_hash(project_dir)
+            return False
+        except OSError:
+            return True
+        return installed != self._manifest_hash(project_dir)
+
+    def _write_install_hash(self, project_dir: str) -> None:
+        """Record the manifests node_modules was installed from."""
+        try:
+            with open(os.path.join(project_dir, "node_modules", ".nm-hash"), "w", encoding="utf-8") as f:
+                f.write(self._manifest_hash(project_dir))
+        except OSError as e:
+            self._logger.warning("Failed to record install hash for %s: %s", project_dir, e)
+
+    async def _run_captured(
+        self,
+        args: List[str],
+        cwd: str,
+        timeout: float,
+        env: Optional[Dict[str, str]] = None
+    ) -> tuple[int, str]:
+        """Run a command, keeping only the tail of its stderr; kills it on timeout.
+
+        stderr goes to a temporary file rather than a pipe: a child the command
+        leaves behind would keep a pipe open, and asyncio's wait() blocks until
+        every pipe is closed. The command runs in its own process group so that
+        such children are killed along with it.
+        """
+        with tempfile.TemporaryFile() as stderr:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                cwd=cwd,
+                env=env,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=stderr,
+                start_new_session=True
+            )
+            try:
+                await asyncio.wait_for(process.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                self._kill_process_group(process)
+                await process.wait()
+                raise
+            finally:
+                # Reap anything the command left running
+                self._kill_process_group(process)
+            tail = await asyncio.to_thread(_read_file_tail, stderr)
+        return process.returncode, tail.decode(errors='replace')
+
+    @staticmethod
+    def _kill_process_group(process: asyncio.subprocess.Process) -> None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
     async def _build_and_serve(
         self,
         server: ViewServer,
@@ -411,47 +1308,46 @@ class ViewManager:
     ) -> None:
         """Build project and start a static server."""
         try:
-            # Check if node_modules exists, if not run npm install first
-            node_modules = os.path.join(project_dir, "node_modules")
-            if not os.path.exists(node_modules):
+            # Install when node_modules is missing or older than the manifests
+            if await asyncio.to_thread(self._needs_install, project_dir):
                 self._logger.info("Installing dependencies for %s", server.session_id)
                 try:
-                    install_process = await asyncio.create_subprocess_exec(
-                        "npm", "install",
-                        cwd=project_dir,
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE
-                    )
-                    stdout, stderr = await asyncio.wait_for(install_process.communicate(), timeout=180)
-                    if install_process.returncode != 0:
-                        error_msg = f'npm install failed: {stderr.decode()[:300]}'
+                    npm_env = {**os.environ, **_NPM_ENV_OVERRIDES}
+                    install_cmd = self._install_command(project_dir)
+                    returncode, stderr = await self._run_captured(install_cmd, project_dir, timeout=180, env=npm_env)
+                    if returncode != 0 and install_cmd[1] == "ci":
+                        # Lockfile out of sync with package.json; let npm install reconcile it
+                        self._logger.warning("npm ci failed for %s, retrying with npm install", server.session_id)
+                        returncode, stderr = await self._run_captured(
+                            ["npm", "install", *_NPM_INSTALL_FLAGS], project_dir, timeout=180, env=npm_env
+                        )
+                    if returncode == 0:
+                        # npm may have rewritten the lockfile; record what is installed now
+                        await asyncio.to_thread(self._write_install_hash, project_dir)
+                    else:
+                        error_msg = f'npm install failed: {stderr[-300:]}'
                         self._logger.error("Install failed for %s: %s", server.session_id, error_msg)
                         server.status = 'error'
                         server.error = error_msg
-                        self._used_ports.discard(server.port)
+                        self._release_port(server)
                         return
                 except asyncio.TimeoutError:
                     error_msg = 'npm install timed out (180s)'
                     self._logger.error("Install timed out for %s", server.session_id)
                     server.status = 'error'
                     server.error = error_msg
-                    self._used_ports.discard(server.port)
+                    self._release_port(server)
                     return
                 except Exception as e:
                     error_msg = f'Failed to install dependencies: {str(e)}'
                     self._logger.error("Install failed for %s: %s", server.session_id, error_msg)
                     server.status = 'error'
                     server.error = error_msg
-                    self._used_ports.discard(server.port)
+                    self._release_port(server)
                     return
             
             dist_dir = None
             # Preserve flow/UNS artifacts across builds (vite may wipe dist/)
-            prebuild_flow_content: str | None = None
-            prebuild_flow_path: str | None = None
-            prebuild_uns_content: str | None = None
-            prebuild_uns_name: str | None = None
-
             prebuild_flow_candidates = [
                 os.path.join(project_dir, "dist", "flow.json"),
                 os.path.join(project_dir, "build", "flow.json"),
@@ -459,135 +1355,126 @@ class ViewManager:
                 os.path.join(session_dir, "flow.json"),
                 os.path.join(session_dir, "app", "flow.json"),
             ]
-            for candidate in prebuild_flow_candidates:
-                if os.path.exists(candidate) and os.path.isfile(candidate):
-                    try:
-                        prebuild_flow_content = Path(candidate).read_text(encoding="utf-8")
-                        prebuild_flow_path = candidate
-                        break
-                    except Exception:
-                        pass
-
-            prebuild_uns_path = self._find_uns_file(session_dir)
-            if prebuild_uns_path and os.path.exists(prebuild_uns_path):
-                try:
-                    prebuild_uns_content = Path(prebuild_uns_path).read_text(encoding="utf-8")
-                    prebuild_uns_name = os.path.basename(prebuild_uns_path)
-                except Exception:
-                    prebuild_uns_content = None
-                    prebuild_uns_name = None
+            prebuild_flow_backup, prebuild_uns_backup = await asyncio.to_thread(
+                self._stash_prebuild_artifacts, prebuild_flow_candidates, session_dir
+            )
 
             # Check if we have a build script
-            if self._has_build_script(project_dir):
+            has_build_script = self._has_build_script(self._read_package_json(project_dir))
+            if has_build_script:
                 if force_clean_build:
-                    for dir_name in ["dist", "build"]:
-                        dir_path = os.path.join(project_dir, dir_name)
-                        if os.path.exists(dir_path):
-                            try:
-                                shutil.rmtree(dir_path)
-                            except Exception as e:
-                                self._logger.warning("Failed to clean %s for %s: %s", dir_path, server.session_id, e)
-
-                max_retries = 3
-                last_error = ""
-                build_started = time.perf_counter()
-                
-                for attempt in range(max_retries):
-                    # Clean dist directory before retry
-                    if attempt > 0:
-                        self._logger.warning("Retry %s/%s for %s", attempt + 1, max_retries, server.session_id)
-                        for dir_name in ["dist", "build"]:
-                            dir_path = os.path.join(project_dir, dir_name)
-                            if os.path.exists(dir_path):
-                                try:
-                                    shutil.rmtree(dir_path)
-                                except Exception as e:
-                                    print(f"[VIEW] Failed to clean {dir_path}: {e}")
-                        await asyncio.sleep(1)
-                    
-                    self._logger.info(
-                        "Building project for %s%s",
-                        server.session_id,
-                        f" (attempt {attempt + 1})" if attempt > 0 else ""
+                    await self._clean_build_output(project_dir, server.session_id)
+
+                cache_key = None
+                if self.build_cache_dir is not None:
+                    cache_key = await asyncio.to_thread(self._build_cache_key, project_dir)
+                # A forced clean build must really rebuild: the key only sees
+                # node_modules through its install marker, so the cached
+                # output may be the bad one
+                if (
+                    cache_key
+                    and not force_clean_build
+                    and await asyncio.to_thread(
+                        self._restore_cached_build, cache_key, project_dir, server.session_id
                     )
+                ):
+                    self._logger.info("Reusing cached build %s for %s", cache_key, server.session_id)
+                else:
+                    max_retries = 3
+                    last_error = ""
+                    build_started = time.perf_counter()
+                
+                    for attempt in range(max_retries):
+                        # Clean dist directory before retry
+                        if attempt > 0:
+                            self._logger.warning("Retry %s/%s for %s", attempt + 1, max_retries, server.session_id)
+                            await self._clean_build_output(project_dir, server.session_id)
+                            await asyncio.sleep(1)
                     
-                    build_process = await asyncio.create_subprocess_exec(
-                        "npm", "run", "build", "--", "--base=./",
-                        cwd=project_dir,
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE
-                    )
+                        self._logger.info(
+                            "Building project for %s%s",
+                            server.session_id,
+                            f" (attempt {attempt + 1})" if attempt > 0 else ""
+                        )
                     
-                    try:
-                        stdout, stderr = await asyncio.wait_for(build_process.communicate(), timeout=180)
+                        try:
+                            returncode, stderr = await self._run_captured(
+                                ["npm", "run", "build", "--", "--base=./"], project_dir, timeout=180
+                            )
                         
-                        if build_process.returncode == 0:
-                            build_elapsed = time.perf_counter() - build_started
-                            self._logger.info("Build succeeded for %s", server.session_id)
-                            self._logger.info("Build duration for %s: %.2fs", server.session_id, build_elapsed)
-                            break
-                        else:
+                            if returncode == 0:
+                                build_elapsed = time.perf_counter() - build_started
+                                self._logger.info("Build succeeded for %s", server.session_id)
+                                self._logger.info("Build duration for %s: %.2fs", server.session_id, build_elapsed)
+                                break
+                            else:
+                                build_elapsed = time.perf_counter() - build_started
+                                last_error = stderr[-500:]
+                                self._logger.error(
+                                    "Build failed (attempt %s) for %s: %s",
+                                    attempt + 1,
+                                    server.session_id,
+                                    last_error[:100]
+                                )
+                                self._logger.error("Build duration for %s: %.2fs", server.session_id, build_elapsed)
+                                if attempt == max_retries - 1:
+                                    server.status = 'error'
+                                    server.error = f'Build failed after {max_retries} attempts: {last_error}'
+                                    self._release_port(server)
+                                    return
+                        except asyncio.TimeoutError:
                             build_elapsed = time.perf_counter() - build_started
-                            last_error = stderr.decode()[:500]
-                            self._logger.error(
-                                "Build failed (attempt %s) for %s: %s",
-                                attempt + 1,
-                                server.session_id,
-                                last_error[:100]
-                            )
+                            last_error = 'Build timed out (180s)'
+                            self._logger.error("Build timed out for %s", server.session_id)
                             self._logger.error("Build duration for %s: %.2fs", server.session_id, build_elapsed)
                             if attempt == max_retries - 1:
                                 server.status = 'error'
-                                server.error = f'Build failed after {max_retries} attempts: {last_error}'
-                                self._used_ports.discard(server.port)
+                                server.error = last_error
+                                self._release_port(server)
                                 return
-                    except asyncio.TimeoutError:
-                        build_elapsed = time.perf_counter() - build_started
-                        last_error = 'Build timed out (180s)'
-                        self._logger.error("Build timed out for %s", server.session_id)
-                        self._logger.error("Build duration for %s: %.2fs", server.session_id, build_elapsed)
-                        if attempt == max_retries - 1:
-                            server.status = 'error'
-                            server.error = last_error
-                            self._used_ports.discard(server.port)
-                            return
+                    
+                    if cache_key:
+                        await asyncio.to_thread(
+                            self._store_cached_build, cache_key, project_dir, server.session_id,
+                            force_clean_build
+                        )
                 
                 # Find dist directory
-                dist_dir = os.path.join(project_dir, "dist")
-                if not os.path.exists(dist_dir):
-                    dist_dir = os.path.join(project_dir, "build")
-                if not os.path.exists(dist_dir):
+                dist_dir = self._find_build_output_dir(project_dir)
+                if dist_dir is None:
                     # Check for .next (Next.js)
                     next_dir = os.path.join(project_dir, ".next")
-                    if os.path.exists(next_dir):
+                    if os.path.isdir(next_dir):
                         dist_dir = project_dir  # Next.js serves from project root
                     else:
                         server.status = 'error'
                         server.error = 'Build completed but dist/build directory not found'
-                        self._used_ports.discard(server.port)
+                        self._release_port(server)
                         return
                 
                 # Restore flow/UNS artifacts if they were present before build
-                if dist_dir and os.path.exists(dist_dir):
-                    try:
-                        if prebuild_flow_content:
-                            (Path(dist_dir) / "flow.json").write_text(prebuild_flow_content, encoding="utf-8")
-                        else:
-                            flow_src = prebuild_flow_path or self._find_flow_file(session_dir, project_dir, None)
-                            if flow_src and os.path.exists(flow_src):
-                                shutil.copy2(flow_src, os.path.join(dist_dir, "flow.json"))
-                    except Exception as e:
-                        self._logger.warning("Failed to restore flow.json for %s: %s", server.session_id, e)
-
-                    try:
-                        if prebuild_uns_content and prebuild_uns_name:
-                            (Path(dist_dir) / prebuild_uns_name).write_text(prebuild_uns_content, encoding="utf-8")
-                        else:
-                            uns_src = self._find_uns_file(session_dir)
-                            if uns_src and os.path.exists(uns_src):
-                                shutil.copy2(uns_src, os.path.join(dist_dir, os.path.basename(uns_src)))
-                    except Exception as e:
-                        self._logger.warning("Failed to restore UNS.json for %s: %s", server.session_id, e)
+                try:
+                    if prebuild_flow_backup:
+                        self._restore_artifact(prebuild_flow_backup, os.path.join(dist_dir, "flow.json"))
+                    else:
+                        flow_src = self._find_flow_file(session_dir, project_dir, None)
+                        if flow_src:
+                            shutil.copy2(flow_src, os.path.join(dist_dir, "flow.json"))
+                except Exception as e:
+                    self._logger.warning("Failed to restore flow.json for %s: %s", server.session_id, e)
+
+                try:
+                    if prebuild_uns_backup:
+                        self._restore_artifact(
+                            prebuild_uns_backup,
+                            os.path.join(dist_dir, os.path.basename(prebuild_uns_backup))
+                        )
+                    else:
+                        uns_src = self._find_uns_file(session_dir)
+                        if uns_src:
+                            shutil.copy2(uns_src, os.path.join(dist_dir, os.path.basename(uns_src)))
+                except Exception as e:
+                    self._logger.warning("Failed to restore UNS.json for %s: %s", server.session_id, e)
 
                 await self._import_session_flow(server.session_id, session_dir, project_dir, dist_dir)
 
@@ -597,50 +1484,30 @@ class ViewManager:
                 self._logger.info("No build script, serving directory directly: %s", project_dir)
                 serve_dir = project_dir
 
-            # Start static server using npx serve
             self._logger.info("Starting static server for %s on port %s", server.session_id, server.port)
-            process = subprocess.Popen(
-                ["npx", "serve", "-s", serve_dir, "-l", str(server.port), "--cors", "--no-clipboard"],
-                cwd=project_dir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                preexec_fn=os.setsid
-            )
-            
-            server.process = process
-            
-            # Wait for server to start
-            port_ready = await self._verify_port_listening(server.port, timeout=15.0)
-            
-            if process.poll() is None and port_ready:
-                server.status = 'running'
-                self._logger.info("Server started for %s on port %s", server.session_id, server.port)
+            # Next.js is served from the project root; keep `serve` for it
+            if has_build_script and serve_dir == project_dir:
+                await self._ensure_serve_resolved()
+                self._unbind_port(server)
+                await self._spawn_serve_process(server, serve_dir, project_dir)
             else:
-                stderr_output = ""
-                if process.poll() is not None:
-                    try:
-                        stderr_output = process.stderr.read().decode()[:200]
-                    except:
-                        pass
-                server.status = 'error'
-                server.error = f'Static server failed to start. {stderr_output}'
-                self._used_ports.discard(server.port)
-                self._logger.error("Server failed to start for %s: %s", server.session_id, server.error)
+                self._unbind_port(server)
+                await self._launch_static_server(server, serve_dir)
             
             # Create build package in background (non-blocking)
             async def create_package():
                 try:
-                    package_path, package_error = await asyncio.to_thread(
-                        self._create_build_package,
+                    package_path, package_error = await self._package_once(
                         server.session_id,
                         session_dir,
                         project_dir,
-                        dist_dir if self._has_build_script(project_dir) else None
+                        dist_dir if has_build_script else None
                     )
                     if package_error:
                         self._logger.error("Package creation failed for %s: %s", server.session_id, package_error)
                     server.package_path = package_path
                     server.package_error = package_error
+                    server.package_checked_at = 0.0
                     async with self._lock:
                         self._cache_package(server.session_id, project_dir, package_path, package_error)
                 except Exception as e:
@@ -650,102 +1517,209 @@ class ViewManager:
             asyncio.create_task(create_package())
             
         except Exception as e:
-            self._used_ports.discard(server.port)
+            self._release_port(server)
             server.status = 'error'
             server.error = str(e)
             self._logger.error("View build exception for %s: %s", server.session_id, e)
             return
     
+    async def _spawn_serve_process(self, server: ViewServer, serve_dir: str, project_dir: str) -> None:
+        """Run `serve` as a subprocess and wait for it to listen."""
+        process = await asyncio.create_subprocess_exec(
+            *self._serve_command(), "-s", serve_dir, "-l", f"tcp://{self.HOST}:{server.port}", "--cors", "--no-clipboard",
+            cwd=project_dir,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True
+        )
+        
+        server.process = process
+        server.watch_task = asyncio.create_task(self._watch_process(server, process))
+        # Keep draining stderr so a chatty server can never block on a full pipe
+        server.stderr_task = asyncio.create_task(_read_tail(process.stderr))
+        
+        # Wait for server to start
+        port_ready = await self._verify_port_listening(server.port, timeout=15.0, process=process)
+        
+        if process.returncode is None and port_ready:
+            server.status = 'running'
+            self._logger.info("Server started for %s on port %s", server.session_id, server.port)
+        else:
+            stderr_output = ""
+            if process.returncode is not None:
+                try:
+                    stderr_tail = await asyncio.wait_for(asyncio.shield(server.stderr_task), timeout=1.0)
+                    stderr_output = stderr_tail.decode(errors='replace')[-200:]
+                except Exception:
+                    pass
+            else:
+                # Alive but never listened; don't leave it holding the port
+                server.process = None
+                await self._terminate(process, server.session_id)
+            server.status = 'error'
+            server.error = f'Static server failed to start. {stderr_output}'
+            self._release_port(server)
+            self._logger.error("Server failed to start for %s: %s", server.session_id, server.error)
+
+    def _start_static_server(self, serve_dir: str, port: int) -> ThreadingHTTPServer:
+        """Bind an in-process static server for serve_dir and run it on a daemon thread."""
+        httpd = _StaticServer((self.HOST, port), partial(_StaticHandler, directory=serve_dir))
+        threading.Thread(target=httpd.serve_forever, name=f"view-static-{port}", daemon=True).start()
+        return httpd
+
+    def _shutdown_static_server(self, httpd: ThreadingHTTPServer) -> None:
+        """Stop an in-process static server and close its socket (blocks until its loop exits)."""
+        httpd.shutdown()
+        httpd.server_close()
+
+    async def _launch_static_server(self, server: ViewServer, serve_dir: str) -> None:
+        """Serve static build output in-process; the port is listening once this returns."""
+        try:
+            server.static_server = await asyncio.to_thread(self._start_static_server, serve_dir, server.port)
+        except OSError as e:
+            server.status = 'error'
+            server.error = f'Static server failed to start. {e}'
+            self._release_port(server)
+            self._logger.error("Server failed to start for %s: %s", server.session_id, server.error)
+            return
+        server.status = 'running'
+        self._logger.info("Server started for %s on port %s", server.session_id, server.port)
+
+    async def _terminate(self, process: asyncio.subprocess.Process, session_id: str) -> None:
+        """SIGTERM a server's process group, escalating to SIGKILL after 0.5s."""
+        if process.returncode is not None:
+            return
+        try:
+            # start_new_session makes the server its own process group leader
+            os.killpg(process.pid, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(process.wait(), timeout=0.5)
+            except asyncio.TimeoutError:
+                os.killpg(process.pid, signal.SIGKILL)
+                # Reap it so the port is actually free once we return
+                await asyncio.wait_for(process.wait(), timeout=1.0)
+        except ProcessLookupError:
+            pass
+        except Exception as e:
+            self._logger.error("Error stopping server for %s: %s", session_id, e)
+
     async def _stop_server(self, session_id: str) -> bool:
-        """Internal method to stop a server (assumes lock is held)."""
+        """Internal method to stop a server (assumes the session lock is held)."""
         if session_id not in self._servers:
             return False
         
         server = self._servers[session_id]
         
-        if server.process and server.process.poll() is None:
-            try:
-                os.killpg(os.getpgid(server.process.pid), signal.SIGTERM)
-                await asyncio.sleep(0.5)
-                if server.process.poll() is None:
-                    os.killpg(os.getpgid(server.process.pid), signal.SIGKILL)
-            except ProcessLookupError:
-                pass
-            except Exception as e:
-                print(f"[VIEW] Error stopping server: {e}")
+        process = server.process
+        # Detach first so _watch_process treats the exit as intentional
+        server.process = None
+        if process:
+            await self._terminate(process, session_id)
+        static_server = server.static_server
+        server.static_server = None
+        if static_server is not None:
+            await asyncio.to_thread(self._shutdown_static_server, static_server)
         
-        self._used_ports.discard(server.port)
+        self._release_port(server)
         server.status = 'stopped'
-        server.process = None
         
         return True
     
     async def stop_view(self, session_id: str) -> bool:
         """Stop a view server for a session."""
-        async with self._lock:
+        async with self._session_lock(session_id):
             result = await self._stop_server(session_id)
             if session_id in self._servers:
                 del self._servers[session_id]
             self._force_clean_build.add(session_id)
             return result
     
-    async def get_status(self, session_id: str) -> Optional[dict]:
-        """Get the status of a view server."""
-        async with self._lock:
-            if session_id not in self._servers:
-                cached = self._package_cache.get(session_id)
-                if cached and cached.get("package_path"):
-                    return {
-                        'session_id': session_id,
-                        'port': None,
-                        'url': None,
-                        'project_dir': cached.get("project_dir"),
-                        'status': 'not_started',
-                        'error': None,
-                        'candidates_found': [],
-                        'package_ready': True,
-                        'package_error': cached.get("package_error"),
-                    }
-                return None
-            
-            server = self._servers[session_id]
-            
-            # Check if process is still running
-            if server.process and server.process.poll() is not None:
-                server.status = 'stopped'
-                self._used_ports.discard(server.port)
-            
-            # Verify port is still listening
-            if server.status == 'running' and not self._is_port_in_use(server.port):
+    async def _probe_server(self, server: ViewServer) -> None:
+        """Refresh a server's status from its port; process exit is handled by _watch_process."""
+        # While the build still holds the port's placeholder bind, nothing else can be listening
+        if server.status in ('running', 'building') and server.port_reservation is None:
+            listening = await self._is_port_in_use(server.port)
+            if server.status == 'running' and not listening:
+                # Verify port is still listening
                 server.status = 'error'
                 server.error = 'Server stopped unexpectedly'
-                self._used_ports.discard(server.port)
-            
-            # Recover from stale "building" state if port is live
-            if server.status == 'building' and self._is_port_in_use(server.port):
+                self._release_port(server)
+            elif server.status == 'building' and listening:
+                # Recover from stale "building" state if port is live
                 server.status = 'running'
-            
-            return {
-                'session_id': server.session_id,
-                'port': server.port,
-                'url': f'http://localhost:{server.port}' if server.status == 'running' else None,
-                'project_dir': server.project_dir,
-                'status': server.status,
-                'error': server.error,
-                'candidates_found': server.candidates_found,
-                'package_ready': bool(server.package_path and os.path.exists(server.package_path)),
-                'package_error': server.package_error
-            }
+        
+        server.last_probe = time.monotonic()
+
+    def _package_ready(self, server: ViewServer) -> bool:
+        """Whether the server's package file exists, re-checked at most once per PACKAGE_READY_TTL."""
+        if not server.package_path:
+            return False
+        now = time.monotonic()
+        if now - server.package_checked_at >= self.PACKAGE_READY_TTL:
+            server.package_exists = os.path.exists(server.package_path)
+            server.package_checked_at = now
+        return server.package_exists
+
+    async def get_status(self, session_id: str) -> Optional[dict]:
+        """Get the status of a view server."""
+        server = self._servers.get(session_id)
+        if server is None:
+            cached = self._get_cached_package(session_id)
+            if cached and cached.get("package_path"):
+                return {
+                    'session_id': session_id,
+                    'port': None,
+                    'url': None,
+                    'project_dir': cached.get("project_dir"),
+                    'status': 'not_started',
+                    'error': None,
+                    'candidates_found': [],
+                    'package_ready': True,
+                    'package_error': cached.get("package_error"),
+                }
+            return None
+        
+        # Polling clients share one probe per PROBE_TTL window
+        if time.monotonic() - server.last_probe >= self.PROBE_TTL:
+            if server.probe_task is None or server.probe_task.done():
+                server.probe_task = asyncio.create_task(self._probe_server(server))
+            await asyncio.shield(server.probe_task)
+        
+        return {
+            'session_id': server.session_id,
+            'port': server.port,
+            'url': f'http://localhost:{server.port}' if server.status == 'running' else None,
+            'project_dir': server.project_dir,
+            'status': server.status,
+            'error': server.error,
+            'candidates_found': server.candidates_found,
+            'package_ready': self._package_ready(server),
+            'package_error': server.package_error
+        }
+
+    async def get_statuses(self, session_ids: List[str]) -> Dict[str, Optional[dict]]:
+        """Get the status of several view servers, probing their ports concurrently."""
+        unique_ids = list(dict.fromkeys(session_ids))
+        statuses = await asyncio.gather(*(self.get_status(session_id) for session_id in unique_ids))
+        return dict(zip(unique_ids, statuses))
+
+    async def _session_project_dir(self, session_id: str, session_dir: str) -> Optional[str]:
+        """Use the project dir the session's view server was built from, else search for one."""
+        server = self._servers.get(session_id)
+        # Port 0 marks a server record created because no project was found
+        if server is not None and server.port:
+            return server.project_dir
+        project_dir, _ = await self.find_project_dir(session_dir)
+        return project_dir
 
     async def prepare_artifacts(self, session_id: str, session_dir: str) -> tuple[Optional[str], Optional[str]]:
         """Create a build package and cache it for download."""
-        project_dir, _ = self._find_project_dir(session_dir)
+        project_dir = await self._session_project_dir(session_id, session_dir)
         if not project_dir:
             return None, "No project directory found"
 
         dist_dir = self._find_build_output_dir(project_dir)
-        package_path, package_error = await asyncio.to_thread(
-            self._create_build_package,
+        package_path, package_error = await self._package_once(
             session_id,
             session_dir,
             project_dir,
@@ -762,11 +1736,11 @@ class ViewManager:
             if server and server.package_path and os.path.exists(server.package_path):
                 return server.package_path
 
-        project_dir, _ = self._find_project_dir(session_dir)
+        project_dir = await self._session_project_dir(session_id, session_dir)
         if not project_dir:
             return None
         dist_dir = self._find_build_output_dir(project_dir)
-        package_path, package_error = self._create_build_package(
+        package_path, package_error = await self._package_once(
             session_id,
             session_dir,
             project_dir,
@@ -778,17 +1752,26 @@ class ViewManager:
             if server:
                 server.package_path = package_path
                 server.package_error = package_error
+                server.package_checked_at = 0.0
             self._cache_package(session_id, project_dir, package_path, package_error)
 
         return package_path
     
     async def cleanup_all(self):
         """Stop all view servers."""
-        async with self._lock:
-            for session_id in list(self._servers.keys()):
+        async def stop(session_id: str) -> None:
+            async with self._session_lock(session_id):
                 await self._stop_server(session_id)
+
+        async with self._lock:
+            # Each stop may wait out a SIGTERM grace period; run them together
+            await asyncio.gather(*(stop(session_id) for session_id in list(self._servers)))
+            for server in self._servers.values():
+                self._release_port(server)
             self._servers.clear()
-            self._used_ports.clear()
+            self._used_mask = 0
+            self._port_cursor = 0
+            self._session_locks.clear()
 
 
 # Global view manager instance
@@ -0,0 +1,88 @@
+"""Tests for SessionDatabase."""
+
+import sqlite3
+
+import pytest
+
+from agent_backend.database import SessionDatabase
+
+
+def _session_row(session_id: str) -> dict:
+    return {
+        "session_id": session_id,
+        "working_directory": f"/tmp/{session_id}",
+        "model": "m",
+        "status": "active",
+        "created_at": "2024-01-01T00:00:00",
+        "last_activity": "2024-01-01T00:00:00",
+    }
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = SessionDatabase(str(tmp_path / "sessions.db"))
+    yield database
+    database.close()
+
+
+def test_reader_connections_are_read_only(db):
+    db.save_session(_session_row("s1"))
+    with db._get_read_conn() as conn:
+        assert conn is not db._conn
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM sessions")
+    assert db.session_exists("s1")
+
+
+def test_nested_writes_join_the_outer_transaction(db):
+    with pytest.raises(RuntimeError):
+        with db._get_conn():
+            db.save_session(_session_row("s1"))
+            raise RuntimeError("abort")
+    assert not db.session_exists("s1")
+
+
+def test_execute_batch_rolls_back_only_the_failing_call(db):
+    def insert_then_fail(session_id: str) -> None:
+        db.save_session(_session_row(session_id))
+        raise ValueError("bad entry")
+
+    errors = db.execute_batch([
+        (db.save_session, (_session_row("ok1"),)),
+        (insert_then_fail, ("bad",)),
+        (db.save_session, (_session_row("ok2"),)),
+    ])
+
+    assert errors[0] is None and errors[2] is None
+    assert isinstance(errors[1], ValueError)
+    assert db.session_exists("ok1") and db.session_exists("ok2")
+    assert not db.session_exists("bad")
+
+
+def test_messages_round_trip_and_delete(db):
+    db.save_session(_session_row("s1"))
+    db.add_messages_bulk("s1", [
+        ("user", "hi", "2024-01-01T00:00:01", None, None),
+        ("assistant", "hello", "2024-01-01T00:00:02", [{"name": "Read"}], "hmm"),
+    ])
+
+    messages = db.load_messages("s1")
+    assert [m["content"] for m in messages] == ["hi", "hello"]
+    assert messages[1]["tool_use"] == [{"name": "Read"}]
+    assert messages[1]["thinking"] == "hmm"
+    assert db.load_session("s1")["message_count"] == 2
+
+    db.delete_messages("s1")
+    assert db.load_messages("s1") == []
+
+
+def test_saving_the_session_row_keeps_its_messages(db):
+    db.save_session(_session_row("s1"))
+    db.add_messages_bulk("s1", [("user", "hi", "2024-01-01T00:00:01", None, None)])
+
+    row = _session_row("s1")
+    row["status"] = "closed"
+    db.save_session(row)
+
+    assert db.load_session("s1")["status"] == "closed"
+    assert [m["content"] for m in db.load_messages("s1")] == ["hi"]
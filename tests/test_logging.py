@@ -0,0 +1,25 @@
+"""Tests for the queue-based logging setup in main."""
+
+import atexit
+import logging
+
+from agent_backend import main
+
+
+def test_log_lines_are_formatted_once(monkeypatch, capsys):
+    root = logging.getLogger()
+    monkeypatch.setattr(root, "handlers", [])
+    monkeypatch.setattr(root, "level", root.level)
+    monkeypatch.setattr(main, "_log_listener", None)
+    monkeypatch.setattr(atexit, "register", lambda fn: fn)
+
+    main._configure_logging()
+    try:
+        logging.getLogger("appbuilder.test").warning("hello")
+    finally:
+        main._log_listener.stop()
+
+    lines = capsys.readouterr().err.strip().splitlines()
+    assert len(lines) == 1
+    assert lines[0].endswith(" WARNING appbuilder.test: hello")
+    assert lines[0].count("WARNING") == 1
@@ -0,0 +1,254 @@
+"""Tests for SessionManager persistence and the per-session skills copy."""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from agent_backend import session as session_module
+from agent_backend.session import SessionManager, _clone_file
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """A fake home directory with one skill, wired in as the skills source."""
+    home_claude = tmp_path / "home" / ".claude"
+    home_agents = tmp_path / "home" / ".agents"
+    skill = home_claude / "skills" / "demo" / "SKILL.md"
+    skill.parent.mkdir(parents=True)
+    skill.write_text("original\n")
+    monkeypatch.setattr(session_module, "_HOME_CLAUDE", home_claude)
+    monkeypatch.setattr(session_module, "_HOME_AGENTS", home_agents)
+    monkeypatch.setattr(
+        session_module,
+        "_SKILL_SOURCES",
+        (home_claude / "skills", home_claude / "plugins", home_agents / "skills"),
+    )
+    return home_claude
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    path = tmp_path / "workspace"
+    path.mkdir()
+    return path
+
+
+def test_clone_file_never_hard_links(tmp_path, monkeypatch):
+    def no_link(*args):
+        raise AssertionError("os.link must not be used")
+
+    monkeypatch.setattr(os, "link", no_link)
+    source = tmp_path / "source.txt"
+    source.write_text("original")
+    dest = tmp_path / "dest.txt"
+
+    _clone_file(str(source), str(dest))
+    dest.write_text("edited")
+
+    assert os.stat(source).st_ino != os.stat(dest).st_ino
+    assert source.read_text() == "original"
+
+
+@pytest.mark.asyncio
+async def test_session_skills_do_not_alias_home_or_template(home, workspace):
+    manager = SessionManager(str(workspace))
+    session = await manager.create_session()
+    try:
+        source = home / "skills" / "demo" / "SKILL.md"
+        template = workspace / "_skills_template" / ".claude" / "skills" / "demo" / "SKILL.md"
+        copied = session._wd_path / ".claude" / "skills" / "demo" / "SKILL.md"
+
+        inodes = {os.stat(path).st_ino for path in (source, template, copied)}
+        assert len(inodes) == 3
+
+        copied.write_text("edited by the agent\n")
+        assert source.read_text() == "original\n"
+        assert template.read_text() == "original\n"
+    finally:
+        await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_messages_are_written_behind(home, workspace):
+    manager = SessionManager(str(workspace))
+    session = await manager.create_session()
+    try:
+        session.add_message("user", "hi")
+        session.add_message("assistant", "hello")
+        # Buffered until the flusher (or an explicit flush) runs
+        assert manager._db.load_messages(session.session_id) == []
+
+        await manager._flush_messages()
+        contents = [m["content"] for m in manager._db.load_messages(session.session_id)]
+        assert contents == ["hi", "hello"]
+    finally:
+        await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_persists_buffered_messages(home, workspace):
+    manager = SessionManager(str(workspace))
+    session = await manager.create_session()
+    session.add_message("user", "hi")
+    await manager.shutdown()
+
+    manager = SessionManager(str(workspace))
+    try:
+        assert [m["content"] for m in manager._db.load_messages(session.session_id)] == ["hi"]
+    finally:
+        await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_unregisters_the_exit_flush(home, workspace, monkeypatch):
+    registered = []
+    monkeypatch.setattr(session_module.atexit, "register", registered.append)
+    monkeypatch.setattr(session_module.atexit, "unregister", registered.remove)
+
+    manager = SessionManager(str(workspace))
+    assert registered == [manager.flush_pending_messages]
+    await manager.shutdown()
+    assert registered == []
+
+
+@pytest.mark.asyncio
+async def test_queued_writes_commit_in_one_batch(home, workspace, monkeypatch):
+    manager = SessionManager(str(workspace))
+    session = await manager.create_session()
+    batches = []
+    execute_batch = manager._db.execute_batch
+
+    def recording_execute_batch(calls):
+        batches.append(len(calls))
+        return execute_batch(calls)
+
+    monkeypatch.setattr(manager._db, "execute_batch", recording_execute_batch)
+    try:
+        await asyncio.gather(
+            manager.update_display_name(session.session_id, "one"),
+            manager.update_sdk_session_id(session.session_id, "sdk"),
+            manager.save_session(session.session_id),
+        )
+        assert batches == [3]
+        row = manager._db.load_session(session.session_id)
+        assert (row["display_name"], row["sdk_session_id"]) == ("one", "sdk")
+    finally:
+        await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_clear_is_ordered_after_queued_inserts(home, workspace):
+    manager = SessionManager(str(workspace))
+    session = await manager.create_session()
+    try:
+        session.add_message("user", "hi")
+        # Take the rows and queue them the way the flusher does, but clear
+        # before the writer task has committed the batch
+        write = asyncio.ensure_future(manager._write_messages(session))
+        await asyncio.sleep(0)
+        assert not session._pending_messages
+
+        await manager.clear_messages(session.session_id)
+        await write
+
+        assert manager._db.load_messages(session.session_id) == []
+        assert session.messages == []
+    finally:
+        await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_clear_discards_buffered_messages(home, workspace):
+    manager = SessionManager(str(workspace))
+    session = await manager.create_session()
+    try:
+        session.add_message("user", "hi")
+        await manager.clear_messages(session.session_id)
+        await manager._flush_messages()
+        assert manager._db.load_messages(session.session_id) == []
+    finally:
+        await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_messages_load_lazily(home, workspace):
+    manager = SessionManager(str(workspace))
+    session = await manager.create_session()
+    session_id = session.session_id
+    for i in range(3):
+        session.add_message("user", f"m{i}")
+    await manager.shutdown()
+
+    reloaded_manager = SessionManager(str(workspace))
+    try:
+        reloaded = await reloaded_manager.get_session(session_id)
+        assert reloaded._messages is None
+        assert reloaded.get_info().message_count == 3
+        assert reloaded._messages is None
+
+        assert [m.content for m in reloaded.messages] == ["m0", "m1", "m2"]
+    finally:
+        await reloaded_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_json_sessions_are_migrated_once(workspace):
+    session_dir = workspace / "legacy1"
+    session_dir.mkdir()
+    json_path = workspace / "_sessions.json"
+    json_path.write_text(json.dumps({"sessions": [{
+        "session_id": "legacy1",
+        "working_directory": str(session_dir),
+        "model": "m",
+        "status": "closed",
+        "created_at": "2024-01-01T00:00:00",
+        "last_activity": "2024-01-01T00:00:00",
+        "messages": [
+            {"role": "user", "content": "hi", "timestamp": "2024-01-01T00:00:01"},
+            {"role": "assistant", "content": "hello", "timestamp": "2024-01-01T00:00:02"},
+        ],
+    }]}))
+
+    manager = SessionManager(str(workspace))
+    try:
+        session = await manager.get_session("legacy1")
+        assert [m.content for m in session.messages] == ["hi", "hello"]
+        assert not json_path.exists()
+        assert (workspace / "_sessions.json.bak").exists()
+        assert (workspace / ".migrated_to_sqlite").exists()
+    finally:
+        await manager.shutdown()
+
+    # A restored JSON file is not imported a second time
+    os.replace(workspace / "_sessions.json.bak", json_path)
+    manager = SessionManager(str(workspace))
+    try:
+        assert len(manager._db.load_messages("legacy1")) == 2
+    finally:
+        await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_failed_directory_delete_is_reported(workspace, monkeypatch):
+    session = session_module.Session("s1", str(workspace / "s1"))
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def failing_rm(*args, **kwargs):
+        return await create_subprocess_exec("sh", "-c", "echo denied >&2; exit 1", **kwargs)
+
+    monkeypatch.setattr(session_module.asyncio, "create_subprocess_exec", failing_rm)
+    assert not await session.delete_working_directory()
+    (workspace / "s1").mkdir()
+    assert not await session.delete_working_directory()
+
+    # Each attempt moved the tree aside under its own tombstone
+    assert not (workspace / "s1").exists()
+    tombstones = [name for name in os.listdir(workspace) if name.endswith(".deleting")]
+    assert len(tombstones) == 2
+
+    monkeypatch.setattr(session_module.asyncio, "create_subprocess_exec", create_subprocess_exec)
+    (workspace / "s1").mkdir()
+    assert await session.delete_working_directory()
+    assert sorted(os.listdir(workspace)) == sorted(tombstones)
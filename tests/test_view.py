@@ -0,0 +1,353 @@
+"""Tests for ViewManager."""
+
+import asyncio
+import json
+import os
+import socket
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agent_backend.view import ViewManager, ViewServer
+
+
+def _new_server(manager: ViewManager, session_id: str) -> ViewServer:
+    port, reservation = manager._allocate_port()
+    return ViewServer(
+        session_id=session_id,
+        port=port,
+        process=None,
+        project_dir="",
+        status="building",
+        port_reservation=reservation,
+        owns_port=True,
+    )
+
+
+def _alive(pid: int) -> bool:
+    """Whether pid is a running (not zombie) process."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    manager = ViewManager(str(tmp_path / "build-cache"))
+    manager.build_cache_dir.mkdir()
+    return manager
+
+
+@pytest.fixture
+def project(tmp_path):
+    project_dir = tmp_path / "session"
+    (project_dir / "src").mkdir(parents=True)
+    (project_dir / "package.json").write_text(json.dumps({"scripts": {"build": "vite build"}}))
+    (project_dir / "src" / "main.js").write_text("console.log(1)\n")
+    return project_dir
+
+
+def test_ports_are_allocated_next_fit(manager):
+    first = _new_server(manager, "a")
+    second = _new_server(manager, "b")
+    assert second.port == first.port + 1
+
+    manager._release_port(first)
+    # A just-released port is handed out last
+    third = _new_server(manager, "c")
+    assert third.port == second.port + 1
+    for server in (second, third):
+        manager._release_port(server)
+
+
+def test_second_release_keeps_a_reallocated_port(manager):
+    manager.PORT_END = manager.PORT_START + 1
+    first = _new_server(manager, "a")
+    manager._release_port(first)
+
+    second = _new_server(manager, "b")
+    assert second.port == first.port
+
+    manager._release_port(first)
+    assert manager._used_mask == 1
+    with pytest.raises(RuntimeError):
+        manager._allocate_port()
+    manager._release_port(second)
+    assert manager._used_mask == 0
+
+
+def test_second_release_is_a_no_op(manager):
+    first = _new_server(manager, "a")
+    manager._release_port(first)
+    assert not first.owns_port
+
+    second = _new_server(manager, "b")
+    # e.g. a failed build followed by _stop_server
+    manager._release_port(first)
+    assert second.owns_port
+    assert manager._used_mask == 1 << (second.port - manager.PORT_START)
+    manager._release_port(second)
+    assert manager._used_mask == 0
+
+
+def test_reservation_blocks_the_port_until_unbound(manager):
+    server = _new_server(manager, "a")
+    with socket.socket() as probe:
+        with pytest.raises(OSError):
+            probe.bind(("127.0.0.1", server.port))
+
+    manager._unbind_port(server)
+    assert server.port_reservation is None
+    assert server.owns_port
+    manager._release_port(server)
+
+
+@pytest.mark.asyncio
+async def test_run_captured_does_not_wait_for_leftover_children(manager, tmp_path):
+    pid_file = tmp_path / "child.pid"
+    started = time.monotonic()
+    returncode, stderr = await manager._run_captured(
+        ["sh", "-c", f"echo failed >&2; sleep 30 & echo $! > {pid_file}"], str(tmp_path), timeout=10
+    )
+    assert time.monotonic() - started < 5
+    assert (returncode, stderr) == (0, "failed\n")
+    await asyncio.sleep(0.1)
+    assert not _alive(int(pid_file.read_text()))
+
+
+@pytest.mark.asyncio
+async def test_run_captured_kills_the_process_group_on_timeout(manager, tmp_path):
+    pid_file = tmp_path / "child.pid"
+    with pytest.raises(asyncio.TimeoutError):
+        await manager._run_captured(
+            ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"], str(tmp_path), timeout=0.5
+        )
+    await asyncio.sleep(0.1)
+    assert not _alive(int(pid_file.read_text()))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_starts_share_one_build(manager, monkeypatch):
+    calls = []
+
+    async def fake_start(session_id, working_directory):
+        calls.append(session_id)
+        await asyncio.sleep(0.01)
+        return ViewServer(session_id, 0, None, working_directory, "building")
+
+    monkeypatch.setattr(manager, "_start_view", fake_start)
+    results = await asyncio.gather(*(manager.start_view("s1", "/tmp/s1") for _ in range(5)))
+
+    assert calls == ["s1"]
+    assert all(result is results[0] for result in results)
+    assert "s1" not in manager._inflight_starts
+
+
+def test_static_server_serves_files_with_spa_fallback(manager, tmp_path):
+    (tmp_path / "index.html").write_text("<html>app</html>")
+    (tmp_path / "app.js").write_text("console.log(1)")
+    port = _free_port()
+    httpd = manager._start_static_server(str(tmp_path), port)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/app.js", timeout=5) as response:
+            assert response.read() == b"console.log(1)"
+            assert response.headers["Access-Control-Allow-Origin"] == "*"
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/some/route", timeout=5) as response:
+            assert response.read() == b"<html>app</html>"
+    finally:
+        manager._shutdown_static_server(httpd)
+
+
+def test_static_server_stays_inside_its_directory(manager, tmp_path):
+    root = tmp_path / "dist"
+    (root / "assets").mkdir(parents=True)
+    (root / "index.html").write_text("<html>app</html>")
+    (root / "assets" / "app.js").write_text("console.log(1)")
+    (tmp_path / "secret.txt").write_text("secret")
+    (root / "leak.txt").symlink_to(tmp_path / "secret.txt")
+    port = _free_port()
+    httpd = manager._start_static_server(str(root), port)
+    try:
+        assert httpd.server_address[0] == manager.HOST
+        # Directories without an index.html are not listed
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/assets/", timeout=5) as response:
+            assert response.read() == b"<html>app</html>"
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/leak.txt", timeout=5)
+        assert excinfo.value.code == 404
+    finally:
+        manager._shutdown_static_server(httpd)
+
+
+def test_build_cache_key_ignores_session_output(manager, project):
+    key = manager._build_cache_key(str(project))
+    (project / "artifacts").mkdir()
+    (project / "artifacts" / "build.zip").write_bytes(b"zip")
+    (project / "logs").mkdir()
+    (project / "logs" / "view.log").write_text("log")
+    (project / ".view-prebuild").mkdir()
+    (project / ".view-prebuild" / "flow.json").write_text("[]")
+    (project / "dist").mkdir()
+    (project / "dist" / "index.html").write_text("built")
+    assert manager._build_cache_key(str(project)) == key
+
+    (project / "src" / "main.js").write_text("console.log(2)\n")
+    assert manager._build_cache_key(str(project)) != key
+
+
+def test_build_cache_key_covers_the_install_marker(manager, project):
+    key = manager._build_cache_key(str(project))
+    (project / "node_modules").mkdir()
+    (project / "node_modules" / "pkg.js").write_text("1")
+    assert manager._build_cache_key(str(project)) == key
+
+    marker = project / "node_modules" / ".nm-hash"
+    marker.write_text("abc")
+    installed = manager._build_cache_key(str(project))
+    assert installed != key
+    # A reinstall rewrites the marker even when the manifests are unchanged
+    os.utime(marker, ns=(0, 0))
+    assert manager._build_cache_key(str(project)) != installed
+
+
+def test_build_cache_round_trip_and_eviction(manager, project, monkeypatch):
+    dist = project / "dist"
+    dist.mkdir()
+    (dist / "index.html").write_text("x" * 100)
+
+    manager._store_cached_build("k0", str(project), "s1")
+    (dist / "index.html").write_text("changed")
+    # Not rewritten unless replace is set
+    manager._store_cached_build("k0", str(project), "s1")
+    assert (manager.build_cache_dir / "k0" / "dist" / "index.html").read_text() == "x" * 100
+    manager._store_cached_build("k0", str(project), "s1", replace=True)
+    assert (manager.build_cache_dir / "k0" / "dist" / "index.html").read_text() == "changed"
+
+    assert manager._restore_cached_build("k0", str(project), "s1")
+    assert (dist / "index.html").read_text() == "changed"
+    assert not manager._restore_cached_build("missing", str(project), "s1")
+
+    monkeypatch.setattr(manager, "BUILD_CACHE_MAX_ENTRIES", 2)
+    for i in range(1, 4):
+        manager._store_cached_build(f"k{i}", str(project), "s1")
+        stamp = time.time() - 100 + i
+        os.utime(manager.build_cache_dir / f"k{i}", (stamp, stamp))
+    # k0 was just restored, so it counts as recently used
+    assert sorted(os.listdir(manager.build_cache_dir)) == ["k0", "k3"]
+
+    # Outputs above the byte cap are never cached
+    monkeypatch.setattr(manager, "BUILD_CACHE_MAX_BYTES", 1)
+    manager._store_cached_build("k4", str(project), "s1")
+    assert not (manager.build_cache_dir / "k4").exists()
+
+
+async def _build(manager, project, force_clean_build, monkeypatch):
+    """Run _build_and_serve with npm and the static server replaced by fakes."""
+    builds = []
+
+    async def fake_run_captured(args, cwd, timeout, env=None):
+        builds.append(args)
+        os.makedirs(os.path.join(cwd, "dist"), exist_ok=True)
+        with open(os.path.join(cwd, "dist", "index.html"), "w") as f:
+            f.write(f"build {len(builds)}")
+        return 0, ""
+
+    async def fake_launch(server, serve_dir):
+        server.status = "running"
+
+    async def fake_package_once(*args):
+        return None, None
+
+    monkeypatch.setattr(manager, "_needs_install", lambda project_dir: False)
+    monkeypatch.setattr(manager, "_run_captured", fake_run_captured)
+    monkeypatch.setattr(manager, "_launch_static_server", fake_launch)
+    monkeypatch.setattr(manager, "_package_once", fake_package_once)
+
+    server = _new_server(manager, "s1")
+    await manager._build_and_serve(server, str(project), str(project), force_clean_build)
+    await asyncio.sleep(0)
+    manager._release_port(server)
+    assert server.status == "running"
+    return builds
+
+
+@pytest.mark.asyncio
+async def test_cached_build_is_reused(manager, project, monkeypatch):
+    assert len(await _build(manager, project, False, monkeypatch)) == 1
+    assert len(await _build(manager, project, False, monkeypatch)) == 0
+    assert (project / "dist" / "index.html").read_text() == "build 1"
+
+
+@pytest.mark.asyncio
+async def test_forced_clean_build_bypasses_the_cache(manager, project, monkeypatch):
+    await _build(manager, project, False, monkeypatch)
+    key = manager._build_cache_key(str(project))
+    (manager.build_cache_dir / key / "dist" / "index.html").write_text("stale")
+
+    assert len(await _build(manager, project, True, monkeypatch)) == 1
+    assert (project / "dist" / "index.html").read_text() == "build 1"
+    # The forced build replaced the cached output
+    assert (manager.build_cache_dir / key / "dist" / "index.html").read_text() == "build 1"
+
+
+@pytest.mark.asyncio
+async def test_deleted_session_cached_builds_are_removed(manager, project):
+    (project / "dist").mkdir()
+    (project / "dist" / "index.html").write_text("built")
+    manager._store_cached_build("shared", str(project), "s1")
+    manager._store_cached_build("own", str(project), "s1")
+    assert manager._restore_cached_build("shared", str(project), "s2")
+
+    await manager.remove_cached_builds("s1")
+    assert sorted(os.listdir(manager.build_cache_dir)) == ["shared"]
+    await manager.remove_cached_builds("s2")
+    assert os.listdir(manager.build_cache_dir) == []
+
+
+def test_uns_file_is_found_in_build_output(manager, tmp_path):
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg" / "uns.json").write_text("{}")
+    assert manager._find_uns_file(str(tmp_path)) is None
+
+    (tmp_path / "web" / "dist").mkdir(parents=True)
+    (tmp_path / "web" / "dist" / "uns.json").write_text("{}")
+    assert manager._find_uns_file(str(tmp_path)) == str(tmp_path / "web" / "dist" / "uns.json")
+
+
+def test_package_json_cache_survives_concurrent_readers(manager, tmp_path, monkeypatch):
+    monkeypatch.setattr(manager, "PKG_JSON_CACHE_SIZE", 4)
+    dirs = []
+    for i in range(64):
+        project_dir = tmp_path / f"p{i}"
+        project_dir.mkdir()
+        (project_dir / "package.json").write_text(json.dumps({"name": f"p{i}"}))
+        dirs.append(str(project_dir))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(manager._read_package_json, dirs * 8))
+
+    assert [pkg["name"] for pkg in results] == [f"p{i}" for i in range(64)] * 8
+    assert len(manager._pkg_json_cache) <= 4
+
+
+def test_identical_package_json_contents_parse_once(manager, tmp_path, monkeypatch):
+    monkeypatch.setattr(manager, "PKG_JSON_CACHE_SIZE", 2)
+    contents = [json.dumps({"name": f"p{i % 3}"}).encode() for i in range(300)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(manager._parse_package_json, contents))
+
+    assert [pkg["name"] for pkg in results] == [f"p{i % 3}" for i in range(300)]
+    assert len(manager._pkg_json_parsed) <= 2
+    assert manager._parse_package_json(contents[0]) is manager._parse_package_json(contents[0])